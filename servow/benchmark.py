@@ -0,0 +1,223 @@
+"""
+Headless benchmarks for the animation effects, question parsing and sound loading.
+Runs without a terminal or speakers: effects draw into an in-memory screen and pygame uses
+SDL's dummy audio driver. Each run is appended to benchresults.jsonl and compared with the
+previous run, so regressions show up between versions.
+
+    python benchmark.py [--sizes 24x80,40x120] [--skip-sound]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")  # Null mixer, must be set before pygame opens audio
+
+from renderfn import Renderer
+from headlessfn import FakeScreen, use_fake_terminal
+
+RESULTS_FILE = "benchresults.jsonl"
+REGRESSION_THRESHOLD = 1.2  # Flag anything 20% slower than the previous run
+SIZES = ((24, 80), (40, 120), (60, 200))
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p95_ms": samples[int(len(samples) * 0.95)] * 1000,
+        "max_ms": samples[-1] * 1000,
+    }
+
+
+def time_frames(frames, renderer):
+    """
+    Per-frame cost of a frame generator: drawing the frame plus the renderer's diff and output.
+    """
+    draw, present = [], []
+    start = time.perf_counter()
+    for _ in frames:
+        drawn = time.perf_counter()
+        renderer.refresh()
+        done = time.perf_counter()
+        draw.append(drawn - start)
+        present.append(done - drawn)
+        start = time.perf_counter()
+    return {
+        "draw": summarize(draw),
+        "present": summarize(present),
+        "bytes_per_frame": renderer.stats()["avg_frame_bytes"],
+    }
+
+
+def bench_effects(sizes):
+    import animatefn
+    import framefn
+    from proton import ascii_candy, ascii_stemclub, ascii_sugarservo
+
+    results = {}
+    for height, width in sizes:
+        use_fake_terminal(height, width)
+        effects = {
+            "cascading_wave_effect": lambda s: animatefn.cascading_wave_frames(s, ascii_stemclub, 3),
+            "blink_candy": lambda s: animatefn.blink_candy_frames(s, ascii_candy),
+            "rise_sugarservo": lambda s: animatefn.slide_sugarservo_frames(s, ascii_sugarservo, rising=True),
+            "fall_sugarservo": lambda s: animatefn.slide_sugarservo_frames(s, ascii_sugarservo, rising=False),
+            "display_scrolling_text": lambda s: animatefn.scrolling_text_frames(s, ascii_sugarservo),
+        }
+        for name, effect in effects.items():
+            # First pass includes compiling the frame tables, the second is steady-state playback
+            for cache in ("cold", "warm"):
+                if cache == "cold":
+                    framefn.clear_layouts()
+                renderer = Renderer(FakeScreen(height, width))
+                results[f"{name}/{height}x{width}/{cache}"] = time_frames(effect(renderer), renderer)
+    return results
+
+
+class ScriptedBackend:
+    """
+    Model backend that replays one canned response text.
+    """
+
+    def __init__(self, text):
+        self.text = text
+
+    def generate(self, prompt, timeout):
+        return self.text, {"prompt_tokens": 0, "output_tokens": 0}
+
+    def stream(self, prompt, timeout):
+        for i in range(0, len(self.text), 24):
+            yield self.text[i:i + 24]
+
+
+def bench_parsing(runs=200):
+    import operationfn
+    from cachefn import QuestionCache
+    from clientfn import CANNED_QUESTION, ModelClient, set_client
+
+    operationfn.question_cache = QuestionCache(":memory:")
+    question = json.dumps(CANNED_QUESTION)
+    responses = {
+        "plain": question,
+        "fenced": "```json\n" + json.dumps(CANNED_QUESTION, indent=4) + "\n```",
+        "chatty": "Sure! Here is your question:\n" + question + "\nGood luck!",
+        "broken": question[:-20],
+    }
+    results = {}
+    for name, text in responses.items():
+        set_client(ModelClient(ScriptedBackend(text)))
+        for mode, on_field in (("buffered", None), ("streamed", lambda path, value: None)):
+            samples = []
+            with contextlib.redirect_stdout(io.StringIO()):
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    operationfn.fetch_question("bio", 3, 8, on_field)
+                    samples.append(time.perf_counter() - start)
+            results[f"fetch_question/{name}/{mode}"] = summarize(samples)
+
+    set_client(ModelClient(ScriptedBackend("[" + ", ".join([question] * 5) + "]")))
+    samples = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(runs):
+            start = time.perf_counter()
+            operationfn.fetch_question_batch("bio", 3, 8, 5)
+            samples.append(time.perf_counter() - start)
+    results["fetch_question_batch/5"] = summarize(samples)
+    set_client(None)
+    return results
+
+
+def bench_sound():
+    import pygame
+    import soundfn
+
+    pygame.mixer.init()
+    results = {}
+    # A fresh PCM cache, so the fill pass really decodes and writes on every run
+    with tempfile.TemporaryDirectory(prefix="servow-pcmcache-") as cache_dir:
+        for label, parallel, pcm_cache in (("serial", False, False), ("parallel", True, False),
+                                           ("pcm_cache_fill", True, True), ("pcm_cache_hit", True, True)):
+            bank = soundfn.SoundBank(pcm_cache=pcm_cache, cache_dir=cache_dir)
+            results[f"sound_bank_load/{label}"] = {"seconds": bank.load(parallel=parallel)}
+    for key, value in soundfn.measure_play_latency(bank).items():
+        results[f"play_latency/{key[:-3]}"] = {"mean_ms": value}
+    pygame.mixer.quit()
+    return results
+
+
+def git_version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def headline(results):
+    # One comparable number per benchmark: mean per-frame/per-call time, or load time
+    numbers = {}
+    for name, result in results.items():
+        if "draw" in result:
+            numbers[name] = result["draw"]["mean_ms"] + result["present"]["mean_ms"]
+        elif "mean_ms" in result:
+            numbers[name] = result["mean_ms"]
+        elif "seconds" in result:
+            numbers[name] = result["seconds"] * 1000
+    return numbers
+
+
+def compare(previous, current):
+    old, new = headline(previous["results"]), headline(current["results"])
+    for name, value in sorted(new.items()):
+        if name in old and old[name] > 0 and value / old[name] > REGRESSION_THRESHOLD:
+            print(f"REGRESSION {name}: {old[name]:.3f}ms -> {value:.3f}ms (vs {previous['version']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", help="comma separated HEIGHTxWIDTH terminal sizes")
+    parser.add_argument("--skip-sound", action="store_true", help="skip the sound loading benchmarks")
+    parser.add_argument("--output", default=RESULTS_FILE)
+    args = parser.parse_args()
+
+    sizes = SIZES
+    if args.sizes:
+        sizes = [tuple(int(n) for n in size.split("x")) for size in args.sizes.split(",")]
+
+    results = {}
+    results.update(bench_effects(sizes))
+    results.update(bench_parsing())
+    if not args.skip_sound:
+        results.update(bench_sound())
+
+    run = {
+        "time": time.time(),
+        "version": git_version(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    for name, value in sorted(headline(results).items()):
+        print(f"{name:55} {value:10.3f} ms")
+
+    previous = None
+    if os.path.exists(args.output):
+        with open(args.output, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        previous = json.loads(lines[-1]) if lines else None
+    if previous:
+        compare(previous, run)
+    with open(args.output, "a", encoding="utf-8") as f:
+        f.write(json.dumps(run) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from tracefn import metrics
+
+
+class QuestionCache:
+    """
+    Persistent store of every parsed question, keyed by subject, difficulty and a content hash.
+    Used to serve questions when the API is down or slower than the latency budget.
+    - max_entries caps the table size, oldest questions are evicted first.
+    - max_age is in seconds, older questions are dropped on the next store.
+    """
+
+    def __init__(self, path="questioncache.db", max_entries=5000, max_age=30 * 24 * 3600):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            """CREATE TABLE IF NOT EXISTS questions (
+                   subject TEXT NOT NULL,
+                   difficulty INTEGER NOT NULL,
+                   hash TEXT NOT NULL,
+                   body TEXT NOT NULL,
+                   created REAL NOT NULL,
+                   served INTEGER NOT NULL DEFAULT 0,
+                   PRIMARY KEY (subject, difficulty, hash)
+               )"""
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS questions_created ON questions (created)")
+        self.db.commit()
+
+    def store(self, subject, difficulty, question):
+        """
+        Save a question (duplicates are ignored) and apply the eviction policy.
+        """
+        body = json.dumps(question, sort_keys=True)
+        digest = hashlib.sha256(body.encode("utf-8")).hexdigest()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR IGNORE INTO questions (subject, difficulty, hash, body, created) VALUES (?, ?, ?, ?, ?)",
+                (subject, difficulty, digest, body, time.time()),
+            )
+            self._evict()
+            self.db.commit()
+
+    def lookup(self, subject, difficulty):
+        """
+        Pick a cached question for the subject, preferring the exact difficulty
+        and then the nearest one, and the least-served question within that.
+        Returns None if nothing is cached for the subject.
+        """
+        with self.lock:
+            row = self.db.execute(
+                """SELECT difficulty, hash, body FROM questions WHERE subject = ?
+                   ORDER BY ABS(difficulty - ?), served, RANDOM() LIMIT 1""",
+                (subject, difficulty),
+            ).fetchone()
+            if row is None:
+                metrics.count("question_cache_lookups_total", result="miss")
+                return None
+            self.db.execute(
+                "UPDATE questions SET served = served + 1 WHERE subject = ? AND difficulty = ? AND hash = ?",
+                (subject, row[0], row[1]),
+            )
+            self.db.commit()
+        metrics.count("question_cache_lookups_total", result="hit")
+        return json.loads(row[2])
+
+    def _evict(self):
+        self.db.execute("DELETE FROM questions WHERE created < ?", (time.time() - self.max_age,))
+        self.db.execute(
+            """DELETE FROM questions WHERE rowid NOT IN
+                   (SELECT rowid FROM questions ORDER BY created DESC LIMIT ?)""",
+            (self.max_entries,),
+        )
+
+    def count(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
@@ -0,0 +1,334 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+
+from tracefn import metrics
+from quotafn import QuotaScheduler, QuotaExceeded, UsageLedger, INTERACTIVE, EXPECTED_OUTPUT_TOKENS
+
+MODEL_NAME = "gemini-1.5-flash"
+DEFAULT_DEADLINE = 15.0  # Seconds per call, including retries
+RETRIES = 2  # Extra attempts after the first
+BACKOFF = 0.5  # Base seconds for the jittered exponential backoff
+BREAKER_THRESHOLD = 5  # Consecutive failures before the breaker opens
+BREAKER_RESET = 30.0  # Seconds the breaker stays open before letting a trial call through
+
+
+class ModelUnavailable(Exception):
+    """
+    Raised when a call can't be made (breaker open) or every attempt failed.
+    """
+
+
+# Backends: generate(prompt, timeout) returns (full text, usage), stream(prompt, timeout) yields text chunks.
+# usage is {"prompt_tokens": n, "output_tokens": n}, estimated where the backend doesn't report it.
+# model_name picks the quota and prices in quotafn.
+
+def estimate_usage(prompt, text):
+    # Roughly four characters per token
+    return {"prompt_tokens": len(prompt) // 4, "output_tokens": len(text) // 4}
+
+
+class GeminiBackend:
+    """
+    Configures the API key and builds the GenerativeModel once, so every call reuses the same connection.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, env_path="keys.env"):
+        import google.generativeai as genai
+        from dotenv import load_dotenv
+
+        load_dotenv(dotenv_path=env_path)
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt, timeout):
+        response = self.model.generate_content(prompt, request_options={"timeout": timeout})
+        metadata = getattr(response, "usage_metadata", None)
+        if metadata is None:
+            return response.text, estimate_usage(prompt, response.text)
+        return response.text, {
+            "prompt_tokens": metadata.prompt_token_count,
+            "output_tokens": metadata.candidates_token_count,
+        }
+
+    def stream(self, prompt, timeout):
+        for chunk in self.model.generate_content(prompt, stream=True, request_options={"timeout": timeout}):
+            yield chunk.text
+
+
+class HTTPBackend:
+    """
+    Talks to a local stub server for load runs: POST {"prompt": ...} to url, reply {"text": ...}.
+    """
+
+    model_name = "http"
+
+    def __init__(self, url):
+        self.url = url
+
+    def generate(self, prompt, timeout):
+        request = urllib.request.Request(
+            self.url, data=json.dumps({"prompt": prompt}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            text = json.loads(response.read())["text"]
+        return text, estimate_usage(prompt, text)
+
+    def stream(self, prompt, timeout):
+        yield self.generate(prompt, timeout)[0]
+
+
+CANNED_QUESTION = {
+    "question": "Which sugar substitute is known to reduce the risk of tooth decay?",
+    "options": {"A": "Sucrose", "B": "Xylitol", "C": "Glucose", "D": "Fructose"},
+    "correct_answer": "B",
+    "explanation": "Xylitol can't be fermented by the bacteria that cause cavities. The others are all sugars those bacteria feed on.",
+}
+CANNED_FAREWELL = "Thanks for visiting the Sugar Servo! Chew that xylitol and keep smiling."
+
+
+class CannedBackend:
+    """
+    Offline backend for testing: answers question prompts with a fixed question and anything else
+    with a fixed farewell, after an optional simulated latency.
+    """
+
+    model_name = "canned"
+
+    def __init__(self, question=CANNED_QUESTION, farewell=CANNED_FAREWELL, latency=0.0):
+        self.question = json.dumps(question)
+        self.farewell = farewell
+        self.latency = latency
+
+    def generate(self, prompt, timeout):
+        time.sleep(min(self.latency, timeout))
+        batch = re.search(r"Generate (\d+) ", prompt)
+        if batch and "JSON array" in prompt:
+            text = "[" + ", ".join([self.question] * int(batch.group(1))) + "]"
+        else:
+            text = self.question if "JSON" in prompt else self.farewell
+        return text, estimate_usage(prompt, text)
+
+    def stream(self, prompt, timeout):
+        text = self.generate(prompt, timeout)[0]
+        for i in range(0, len(text), 16):
+            yield text[i:i + 16]
+
+
+class ModelClient:
+    """
+    Long-lived model client shared by operationfn and proton.
+    - every call has a deadline, enforced here even if the backend ignores its timeout
+    - failed attempts are retried with jittered exponential backoff while the deadline allows
+    - after BREAKER_THRESHOLD consecutive failures calls fail fast for BREAKER_RESET seconds
+    - attempts wait for quota first (see quotafn.QuotaScheduler), interactive before background
+    - identical prompts already in flight are answered by that one call (generate only)
+    - every successful call is added to the day's usage and cost in the ledger
+    """
+
+    def __init__(self, backend, deadline=DEFAULT_DEADLINE, retries=RETRIES, quota=None, ledger=None):
+        self.backend = backend
+        self.model_name = getattr(backend, "model_name", MODEL_NAME)
+        self.deadline = deadline
+        self.retries = retries
+        self.quota = quota
+        self.ledger = ledger
+        self.failures = 0
+        self.open_until = 0.0
+        self.lock = threading.Lock()
+        self.inflight = {}  # prompt -> Future of (text, usage)
+        self.coalesced = 0
+        # Enough workers that calls the quota lets through never queue behind each other here
+        self.executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="model-call")
+
+    def generate(self, prompt, deadline=None, with_usage=False, priority=INTERACTIVE):
+        """
+        Full response text for a prompt, or (text, usage) with_usage.
+        Raises ModelUnavailable if it can't be had in time.
+        """
+        end = time.monotonic() + (deadline or self.deadline)
+        with self.lock:
+            shared = self.inflight.get(prompt)
+            if shared is None:
+                future = self.inflight[prompt] = Future()
+            else:
+                self.coalesced += 1
+        if shared is not None:
+            metrics.count("api_coalesced_total")
+            try:
+                text, usage = shared.result(timeout=max(end - time.monotonic(), 0))
+            except TimeoutError:
+                raise ModelUnavailable("Timed out waiting on an identical call in flight")
+            return (text, usage) if with_usage else text
+
+        try:
+            text, usage = self._generate(prompt, end, priority)
+            future.set_result((text, usage))
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.inflight.pop(prompt, None)
+        return (text, usage) if with_usage else text
+
+    def _generate(self, prompt, end, priority):
+        last_error = None
+        for attempt in range(self.retries + 1):
+            self._check_breaker()
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            reserved = self._acquire(prompt, priority, end)
+            future = self.executor.submit(self.backend.generate, prompt, end - time.monotonic())
+            try:
+                text, usage = future.result(timeout=max(end - time.monotonic(), 0))
+                self._record(success=True)
+                self._account(reserved, usage)
+                return text, usage
+            except TimeoutError as e:
+                last_error = e
+                self._record(success=False)
+                break  # Deadline spent, no time left to retry
+            except Exception as e:
+                last_error = e
+                self._record(success=False, error=e)
+            delay = BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5)
+            if time.monotonic() + delay >= end:
+                break
+            time.sleep(delay)
+        raise ModelUnavailable(f"Model call failed: {last_error!r}")
+
+    def stream(self, prompt, deadline=None, priority=INTERACTIVE):
+        """
+        Yield response text chunks. Retries only happen before the first chunk arrives,
+        after that a failure is raised to the caller. Chunks are read on the executor, so a
+        backend that stalls mid-stream still can't hold the caller past the deadline.
+        """
+        end = time.monotonic() + (deadline or self.deadline)
+        last_error = None
+        for attempt in range(self.retries + 1):
+            self._check_breaker()
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            reserved = self._acquire(prompt, priority, end)
+            chunks = iter(self.backend.stream(prompt, end - time.monotonic()))
+            received = []
+            try:
+                while True:
+                    chunk = self.executor.submit(next, chunks, None).result(timeout=max(end - time.monotonic(), 0))
+                    if chunk is None:
+                        break
+                    received.append(chunk)
+                    yield chunk
+                self._record(success=True)
+                self._account(reserved, estimate_usage(prompt, "".join(received)))
+                return
+            except TimeoutError as e:
+                last_error = e
+                self._record(success=False)
+                if received:
+                    raise ModelUnavailable("Model stream stalled past its deadline") from e
+                break  # Deadline spent, no time left to retry
+            except Exception as e:
+                last_error = e
+                self._record(success=False, error=e)
+                if received:
+                    raise
+            delay = BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5)
+            if time.monotonic() + delay >= end:
+                break
+            time.sleep(delay)
+        raise ModelUnavailable(f"Model stream failed: {last_error!r}")
+
+    def _acquire(self, prompt, priority, end):
+        """
+        Wait for quota for one attempt, returns the tokens reserved for it.
+        """
+        reserved = estimate_usage(prompt, "")["prompt_tokens"] + EXPECTED_OUTPUT_TOKENS
+        if self.quota is not None:
+            try:
+                self.quota.acquire(self.model_name, reserved, priority, end)
+            except QuotaExceeded as e:
+                raise ModelUnavailable(str(e)) from e
+        return reserved
+
+    def _account(self, reserved, usage):
+        if self.quota is not None:
+            self.quota.settle(self.model_name, reserved, usage["prompt_tokens"] + usage["output_tokens"])
+        if self.ledger is not None:
+            self.ledger.record(self.model_name, usage)
+
+    def _check_breaker(self):
+        with self.lock:
+            if time.monotonic() < self.open_until:
+                raise ModelUnavailable("Circuit breaker open, skipping model call")
+
+    def _record(self, success, error=None):
+        metrics.count("api_calls_total", outcome="ok" if success else "error")
+        if error is not None and self.quota is not None and is_rate_limit(error):
+            self.quota.throttled(self.model_name)
+        with self.lock:
+            if success:
+                self.failures = 0
+                self.open_until = 0.0
+            else:
+                self.failures += 1
+                metrics.count("api_failures_total")
+                if self.failures >= BREAKER_THRESHOLD:
+                    self.open_until = time.monotonic() + BREAKER_RESET
+                    print(f"Model circuit breaker open for {BREAKER_RESET}s after {self.failures} failures")
+
+    @property
+    def breaker_open(self):
+        return time.monotonic() < self.open_until
+
+
+def is_rate_limit(error):
+    # google.api_core raises ResourceExhausted for 429s, urllib's HTTPError says "HTTP Error 429"
+    return type(error).__name__ == "ResourceExhausted" or "429" in str(error)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def make_backend():
+    """
+    Backend picked by SERVOW_BACKEND: "gemini" (default), "canned", or "http" with SERVOW_BACKEND_URL.
+    """
+    kind = os.getenv("SERVOW_BACKEND", "gemini")
+    if kind == "canned":
+        return CannedBackend(latency=float(os.getenv("SERVOW_CANNED_LATENCY", "0")))
+    if kind == "http":
+        return HTTPBackend(os.getenv("SERVOW_BACKEND_URL", "http://127.0.0.1:8765/generate"))
+    return GeminiBackend()
+
+
+def get_client():
+    """
+    The shared ModelClient, created on first use.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            ledger = UsageLedger()
+            _client = ModelClient(make_backend(), quota=QuotaScheduler(ledger=ledger), ledger=ledger)
+        return _client
+
+
+def set_client(client):
+    """
+    Swap the shared client, e.g. for a ModelClient(CannedBackend()) in tests and load runs.
+    """
+    global _client
+    with _client_lock:
+        _client = client
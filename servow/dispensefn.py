@@ -0,0 +1,216 @@
+import os
+import queue
+import random
+import select
+import termios
+import threading
+import time
+import tty
+from concurrent.futures import Future
+
+# Frame: STX, seq, cmd, length, payload..., checksum, ETX
+# checksum is the XOR of seq, cmd, length and the payload bytes.
+# The dispenser answers each command with an ACK (or NAK) frame carrying the same seq.
+# A resend keeps its seq, so the dispenser must re-ACK a repeated seq without dispensing again.
+STX = 0x02
+ETX = 0x03
+CMD_DISPENSE = ord("D")
+CMD_ACK = 0x06
+CMD_NAK = 0x15
+
+# Status byte carried in an ACK
+STATUS_OK = 0
+STATUS_EMPTY = 1
+STATUS_JAMMED = 2
+STATUS_TEXT = {STATUS_OK: "ok", STATUS_EMPTY: "dispenser empty", STATUS_JAMMED: "dispenser jammed"}
+
+ACK_TIMEOUT = 3.0  # Seconds to wait for an acknowledgement (sent once the candy drops) before resending
+RETRIES = 3  # Resends after the first attempt
+
+
+def encode_frame(seq, cmd, payload=b""):
+    body = bytes([seq & 0xFF, cmd, len(payload)]) + bytes(payload)
+    checksum = 0
+    for byte in body:
+        checksum ^= byte
+    return bytes([STX]) + body + bytes([checksum, ETX])
+
+
+class FrameReader:
+    """
+    Collects bytes from the link and returns complete, checksum-valid frames as (seq, cmd, payload).
+    Noise and corrupted frames are skipped.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer.extend(data)
+        frames = []
+        while True:
+            start = self.buffer.find(STX)
+            if start == -1:
+                self.buffer.clear()
+                return frames
+            del self.buffer[:start]
+            if len(self.buffer) < 4:
+                return frames
+            length = self.buffer[3]
+            end = 4 + length + 2
+            if len(self.buffer) < end:
+                return frames
+            frame = bytes(self.buffer[:end])
+            checksum = 0
+            for byte in frame[1:4 + length]:
+                checksum ^= byte
+            if frame[-1] != ETX or frame[-2] != checksum:
+                del self.buffer[:1]  # Not a real frame start, look for the next STX
+                continue
+            del self.buffer[:end]
+            frames.append((frame[1], frame[2], frame[4:4 + length]))
+
+
+class DispenseResult:
+    def __init__(self, ok, status, attempts, latency, error=None):
+        self.ok = ok
+        self.status = status
+        self.attempts = attempts
+        self.latency = latency  # Seconds from queueing the command to its acknowledgement
+        self.error = error
+
+    @property
+    def message(self):
+        if self.error:
+            return self.error
+        return STATUS_TEXT.get(self.status, f"status {self.status}")
+
+    def __repr__(self):
+        return f"DispenseResult(ok={self.ok}, status={self.message!r}, attempts={self.attempts}, latency={self.latency:.3f}s)"
+
+
+class DispenseTransport:
+    """
+    Sends dispense commands over a serial link from its own thread, so the UI never waits on the port.
+    submit() queues a command and returns a Future for its DispenseResult. Each command is resent
+    on a NAK or a missing ACK, up to RETRIES times.
+    """
+
+    def __init__(self, port, baudrate=termios.B9600, ack_timeout=ACK_TIMEOUT, retries=RETRIES):
+        self.port = port
+        self.ack_timeout = ack_timeout
+        self.retries = retries
+        self.fd = os.open(port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        tty.setraw(self.fd)
+        attrs = termios.tcgetattr(self.fd)
+        attrs[4] = attrs[5] = baudrate  # Input and output speed
+        termios.tcsetattr(self.fd, termios.TCSANOW, attrs)
+        self.reader = FrameReader()
+        self.seq = 0
+        self.latencies = []
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="dispense", daemon=True)
+        self.thread.start()
+
+    def submit(self, count=1):
+        future = Future()
+        self.requests.put((bytes([count]), time.monotonic(), future))
+        return future
+
+    def _run(self):
+        while True:
+            payload, queued_at, future = self.requests.get()
+            if payload is None:
+                return
+            try:
+                result = self._send(payload, queued_at)
+            except OSError as e:
+                result = DispenseResult(False, None, 0, time.monotonic() - queued_at, f"serial error: {e}")
+            if result.ok:
+                self.latencies.append(result.latency)
+            future.set_result(result)
+
+    def _send(self, payload, queued_at):
+        self.seq = (self.seq + 1) % 256
+        frame = encode_frame(self.seq, CMD_DISPENSE, payload)
+        for attempt in range(1, self.retries + 2):
+            os.write(self.fd, frame)
+            reply = self._wait_for_reply(self.seq)
+            if reply is not None and reply[0] == CMD_ACK:
+                status = reply[1][0] if reply[1] else STATUS_OK
+                return DispenseResult(status == STATUS_OK, status, attempt, time.monotonic() - queued_at)
+        return DispenseResult(False, None, self.retries + 1, time.monotonic() - queued_at, "no acknowledgement from dispenser")
+
+    def _wait_for_reply(self, seq):
+        """
+        (cmd, payload) of the reply to seq, or None on timeout. Replies to older frames are ignored.
+        """
+        deadline = time.monotonic() + self.ack_timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            readable, _, _ = select.select([self.fd], [], [], remaining)
+            if not readable:
+                return None
+            for reply_seq, cmd, payload in self.reader.feed(os.read(self.fd, 256)):
+                if reply_seq == seq:
+                    return cmd, payload
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return {"dispensed": 0}
+        return {
+            "dispensed": len(latencies),
+            "mean_ms": sum(latencies) / len(latencies) * 1000,
+            "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+            "max_ms": latencies[-1] * 1000,
+        }
+
+    def close(self):
+        self.requests.put((None, None, None))
+        self.thread.join(timeout=1)
+        os.close(self.fd)
+
+
+class FakeDispenser:
+    """
+    Stand-in dispenser on a pseudo-terminal, for running the kiosk and tests without hardware.
+    Open a DispenseTransport on .port. It ACKs each dispense after dispense_time, and can be
+    told to drop a share of frames to exercise the retry path.
+    """
+
+    def __init__(self, dispense_time=0.5, drop_rate=0.0, status=STATUS_OK):
+        self.dispense_time = dispense_time
+        self.drop_rate = drop_rate
+        self.status = status
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.master)
+        self.port = os.ttyname(self.slave)
+        self.received = []  # (seq, payload) of every dispense command carried out
+        self.last_seq = None
+        self.reader = FrameReader()
+        self.thread = threading.Thread(target=self._run, name="fake-dispenser", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                data = os.read(self.master, 256)
+            except OSError:
+                return  # pty closed
+            for seq, cmd, payload in self.reader.feed(data):
+                if cmd != CMD_DISPENSE:
+                    continue
+                if random.random() < self.drop_rate:
+                    continue  # Simulate a lost frame, the transport should resend
+                if seq != self.last_seq:
+                    self.last_seq = seq
+                    self.received.append((seq, payload))
+                    time.sleep(self.dispense_time)
+                os.write(self.master, encode_frame(seq, CMD_ACK, bytes([self.status])))
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
@@ -0,0 +1,175 @@
+import json
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from clientfn import get_client
+from quotafn import BACKGROUND
+from tracefn import metrics
+
+candyJokePrompt = "say a custom dental goodbye for using the xylitol vending machine service and a congrats for getting the question correct. your response will be directly printed in the program"
+
+POOL_FILE = os.getenv("SERVOW_FAREWELL_FILE", "farewells.json")
+BATCH_SIZE = 8  # Farewells asked for per background call
+REFILL_BELOW = 4  # Ready farewells left before a refill starts
+CAPACITY = 40  # Ready farewells kept at most
+RECENT = 50  # Farewells remembered after being shown, so refills don't bring them back
+
+# Served in turn when the pool is empty, e.g. offline or before the first refill lands
+FALLBACK_FAREWELLS = [
+    "Congrats on getting it right! Enjoy your xylitol, and remember to brush twice a day!",
+    "Well done, genius! Xylitol keeps the cavity bugs hungry. Thanks for visiting the Sugar Servo!",
+    "Correct! Your brain is sharp and your teeth will be too. See you next time at the Sugar Servo!",
+    "Nice work! Chew that xylitol, floss tonight, and keep smiling. Thanks for stopping by!",
+    "You got it! A sweet reward that your dentist approves of. Thanks for using the Sugar Servo!",
+    "Brilliant answer! Keep those molars happy and come back for another question soon.",
+]
+
+
+def build_farewell_prompt(count):
+    return (
+        f"{candyJokePrompt}. Write {count} different ones, each a single line of at most two sentences, "
+        "one per line, with no numbering and nothing else."
+    )
+
+
+def parse_farewells(text):
+    """
+    One farewell per non-empty line, with any list numbering or bullets the model added stripped off.
+    """
+    farewells = []
+    for line in text.splitlines():
+        line = re.sub(r"^\s*(?:[-*•]|\d+[.)])\s*", "", line).strip().strip('"').strip()
+        if len(line) >= 10:
+            farewells.append(line)
+    return farewells
+
+
+def fetch_farewells(count):
+    return parse_farewells(get_client().generate(build_farewell_prompt(count), priority=BACKGROUND))
+
+
+def farewell_key(text):
+    # Near-identical farewells (case, spacing, punctuation) count as duplicates
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+
+
+class FarewellPool:
+    """
+    Ready farewell messages, so the farewell screen never waits on the model.
+    - fetch_batch(count) returns a list of new farewells; it is called in the background whenever
+      fewer than refill_below are ready, one call at a time.
+    - new farewells matching a ready or recently shown one are dropped.
+    - ready and recently shown farewells are saved to path, so a restart picks up where it left off.
+    - with nothing ready, the bundled fallback farewells are served in turn.
+    """
+
+    def __init__(self, fetch_batch, path=POOL_FILE, fallback=FALLBACK_FAREWELLS, batch_size=BATCH_SIZE,
+                 refill_below=REFILL_BELOW, capacity=CAPACITY, recent=RECENT):
+        self.fetch_batch = fetch_batch
+        self.path = path
+        self.fallback = list(fallback)
+        self.batch_size = batch_size
+        self.refill_below = refill_below
+        self.capacity = capacity
+        self.ready = deque()
+        self.recent = deque(maxlen=recent)
+        self.next_fallback = 0
+        self.filling = False
+        self.served = 0
+        self.fallbacks = 0
+        self.duplicates = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="farewells")
+        self._load()
+
+    def take(self):
+        """
+        The next farewell, straight away. Starts a refill if the pool is running low.
+        """
+        with self.lock:
+            self.served += 1
+            if self.ready:
+                text = self.ready.popleft()
+                self.recent.append(text)
+                source = "pool"
+            else:
+                text = self.fallback[self.next_fallback % len(self.fallback)]
+                self.next_fallback += 1
+                self.fallbacks += 1
+                source = "fallback"
+            self._save()
+        metrics.count("farewells_served_total", source=source)
+        self.refill()
+        return text
+
+    def refill(self):
+        """
+        Schedule a background batch if fewer than refill_below farewells are ready. take() calls this
+        after every farewell; while a batch is already being fetched it returns straight away.
+        """
+        with self.lock:
+            if self.filling or len(self.ready) >= self.refill_below:
+                return
+            self.filling = True
+        self.executor.submit(self._fill)
+
+    def _fill(self):
+        try:
+            farewells = self.fetch_batch(self.batch_size)
+        except Exception as e:
+            print(f"Farewell refill failed: {e}")
+            farewells = []
+        with self.lock:
+            self.filling = False
+            known = {farewell_key(text) for text in self.ready}
+            known.update(farewell_key(text) for text in self.recent)
+            added = 0
+            for text in farewells:
+                key = farewell_key(text)
+                if key in known:
+                    self.duplicates += 1
+                    continue
+                if len(self.ready) >= self.capacity:
+                    break
+                known.add(key)
+                self.ready.append(text)
+                added += 1
+            if added:
+                self._save()
+        metrics.count("farewells_generated_total", added)
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f)
+            self.ready.extend(saved.get("ready", [])[:self.capacity])
+            self.recent.extend(saved.get("recent", []))
+        except (OSError, ValueError, AttributeError):
+            pass  # Nothing saved or unreadable: serve fallbacks until the first refill lands
+
+    def _save(self):
+        try:
+            with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"ready": list(self.ready), "recent": list(self.recent)}, f, indent=2)
+            os.replace(self.path + ".tmp", self.path)
+        except OSError as e:
+            print(f"Could not save farewells: {e}")
+
+    def stats(self):
+        with self.lock:
+            return {
+                "ready": len(self.ready),
+                "served": self.served,
+                "fallbacks": self.fallbacks,
+                "duplicates": self.duplicates,
+                "filling": self.filling,
+            }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+farewell_pool = FarewellPool(fetch_farewells)
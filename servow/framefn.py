@@ -0,0 +1,150 @@
+import curses
+from functools import lru_cache
+
+from renderfn import put_text
+
+# A frame is a tuple of (y, x, text) runs, already clipped to the screen,
+# so playing an effect back is just one addstr per run.
+# Layouts are cached per asset and terminal size, AssetRegistry drops them on a resize.
+
+
+@lru_cache(maxsize=None)
+def split_art(art):
+    """
+    Split an ASCII asset once: its lines, height and widest line.
+    """
+    lines = tuple(art.splitlines())
+    width = max((len(line) for line in lines), default=0)
+    return lines, len(lines), width
+
+
+def clip_run(y, x, text, screen_height, screen_width):
+    """
+    Clip one run of text to the screen, returning None if nothing is visible.
+    """
+    if not 0 <= y < screen_height or not text:
+        return None
+    if x < 0:
+        text = text[-x:]
+        x = 0
+    text = text[:max(screen_width - x, 0)]
+    return (y, x, text) if text else None
+
+
+@lru_cache(maxsize=32)
+def centered_frame(art, screen_height, screen_width):
+    """
+    The asset centered on the screen as a single frame.
+    """
+    lines, height, width = split_art(art)
+    start_y = (screen_height - height) // 2
+    start_x = (screen_width - width) // 2
+    runs = (clip_run(start_y + i, start_x, line, screen_height, screen_width) for i, line in enumerate(lines))
+    return tuple(run for run in runs if run)
+
+
+@lru_cache(maxsize=32)
+def wave_frames(art, screen_height, screen_width, amplitude=5):
+    """
+    Frames for cascading_wave_effect, one per step of the wave across the widest line.
+    The offset for a column only depends on (column - step) mod width, so it is computed
+    once per width as a table and every frame just indexes it.
+    """
+    lines, height, width = split_art(art)
+    start_y = (screen_height - height) // 2
+    start_x = (screen_width - width) // 2
+    offset_table = [int(amplitude * abs(k - width / 2) / width) for k in range(width)]
+
+    frames = []
+    for step in range(width):
+        offsets = offset_table[-step:] + offset_table[:-step] if step else offset_table
+        runs = []
+        for line_idx, line in enumerate(lines):
+            # Group neighbouring characters that share an offset into one run, skipping spaces
+            run_start, run_offset = None, None
+            for char_idx in range(len(line) + 1):
+                char = line[char_idx] if char_idx < len(line) else " "
+                offset = offsets[char_idx] if char_idx < len(line) else None
+                if run_start is not None and (not char.strip() or offset != run_offset):
+                    run = clip_run(start_y + line_idx - run_offset, start_x + run_start,
+                                   line[run_start:char_idx], screen_height, screen_width)
+                    if run:
+                        runs.append(run)
+                    run_start = None
+                if run_start is None and char.strip():
+                    run_start, run_offset = char_idx, offset
+        frames.append(tuple(runs))
+    return tuple(frames)
+
+
+@lru_cache(maxsize=32)
+def slide_frames(art, screen_height, screen_width, rising):
+    """
+    Frames for rise_sugarservo/fall_sugarservo, with the index of the frame where the art is centered.
+    """
+    lines, height, width = split_art(art)
+    start_x = max((screen_width - width) // 2, 0)
+    middle_y = (screen_height - height) // 2
+    offsets = range(screen_height, -height, -1) if rising else range(-height, screen_height)
+
+    frames = []
+    middle_index = None
+    for index, offset in enumerate(offsets):
+        runs = (clip_run(offset + i, start_x, line, screen_height, screen_width) for i, line in enumerate(lines))
+        frames.append(tuple(run for run in runs if run))
+        if offset == middle_y:
+            middle_index = index
+    return tuple(frames), middle_index
+
+
+@lru_cache(maxsize=32)
+def scroll_strip(art, screen_width):
+    """
+    Lines for display_scrolling_text, each padded out to art width + screen width.
+    The screen shows a screen-wide window of the strip, so one strip serves every frame and call.
+    """
+    lines, height, width = split_art(art)
+    return tuple(line.ljust(width + screen_width) for line in lines)
+
+
+LAYOUT_CACHES = (centered_frame, wave_frames, slide_frames, scroll_strip)
+
+
+def clear_layouts():
+    for cache in LAYOUT_CACHES:
+        cache.cache_clear()
+
+
+class AssetRegistry:
+    """
+    The kiosk's ASCII assets by name, split once when registered.
+    resize() is hooked to the renderer (see Renderer.resize_listeners): on a new terminal size
+    the cached layouts for the old one are dropped, and effects lay out again for the new size.
+    """
+
+    def __init__(self):
+        self.assets = {}
+        self.size = None
+        self.resizes = 0
+
+    def register(self, name, art):
+        split_art(art)
+        self.assets[name] = art
+        return art
+
+    def __getitem__(self, name):
+        return self.assets[name]
+
+    def resize(self, screen_height, screen_width):
+        if self.size is not None and self.size != (screen_height, screen_width):
+            clear_layouts()
+            self.resizes += 1
+        self.size = (screen_height, screen_width)
+
+
+assets = AssetRegistry()
+
+
+def blit(stdscr, frame, attr=curses.A_NORMAL):
+    for y, x, text in frame:
+        put_text(stdscr, y, x, text, attr)
@@ -0,0 +1,60 @@
+import curses
+
+# Stand-ins for running the kiosk's drawing code without a terminal, see benchmark.py and replayfn.py
+
+
+class FakeScreen:
+    """
+    In-memory stand-in for stdscr (and pads): keeps the cells, raises curses.error where curses would.
+    """
+
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.cells = [[" "] * width for _ in range(height)]
+        self.writes = 0
+
+    def getmaxyx(self):
+        return self.height, self.width
+
+    def addstr(self, y, x, text, attr=0):
+        if not (0 <= y < self.height and 0 <= x < self.width):
+            raise curses.error("addstr() returned ERR")
+        self.writes += 1
+        row = self.cells[y]
+        for char in text:
+            if x >= self.width:
+                y, x = y + 1, 0
+                if y >= self.height:
+                    raise curses.error("addstr() returned ERR")
+                row = self.cells[y]
+            row[x] = char
+            x += 1
+
+    def addch(self, y, x, char, attr=0):
+        self.addstr(y, x, chr(char) if isinstance(char, int) else char, attr)
+
+    def clear(self):
+        self.cells = [[" "] * self.width for _ in range(self.height)]
+
+    erase = clear
+
+    def refresh(self, *args):
+        pass
+
+    def timeout(self, ms):
+        pass
+
+    def nodelay(self, flag):
+        pass
+
+    def getch(self):
+        return -1
+
+
+def use_fake_terminal(height, width):
+    # Module-level curses state the effects read, normally set up by initscr()
+    curses.LINES, curses.COLS = height, width
+    curses.start_color = lambda: None
+    curses.init_pair = lambda *args: None
+    curses.color_pair = lambda n: n << 8
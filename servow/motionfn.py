@@ -0,0 +1,208 @@
+import math
+import threading
+import time
+
+CONTROL_RATE = 50  # Control loop ticks per second
+EASING_SAMPLES = 1024  # Resolution of the precomputed easing tables
+
+
+def _table(fn):
+    return [fn(i / (EASING_SAMPLES - 1)) for i in range(EASING_SAMPLES)]
+
+
+# Easing curves precomputed once as tables over 0..1, so building a trajectory is just indexing
+EASINGS = {
+    "linear": _table(lambda t: t),
+    "ease_in": _table(lambda t: t * t),
+    "ease_out": _table(lambda t: 1 - (1 - t) * (1 - t)),
+    "ease_in_out": _table(lambda t: 0.5 - 0.5 * math.cos(math.pi * t)),
+}
+
+
+class ServoLimits:
+    def __init__(self, min_angle=0.0, max_angle=180.0, max_speed=180.0):
+        self.min_angle = min_angle
+        self.max_angle = max_angle
+        self.max_speed = max_speed  # Degrees per second
+
+    def clamp(self, angle):
+        return min(max(angle, self.min_angle), self.max_angle)
+
+
+def build_trajectory(start, end, duration, easing="ease_in_out", rate=CONTROL_RATE, limits=None, steps=None):
+    """
+    Angles for every control tick of a move, start excluded and end included.
+    steps gives the tick count directly instead of working it out from duration.
+    With limits, the target is clamped and the move is stretched until no tick exceeds max_speed.
+    """
+    table = EASINGS[easing]
+    if limits is not None:
+        end = limits.clamp(end)
+    if steps is None:
+        steps = int(math.ceil(duration * rate))
+    steps = max(steps, 1)
+    while True:
+        scale = (EASING_SAMPLES - 1) / steps
+        delta = end - start
+        angles = [start + delta * table[int(round(i * scale))] for i in range(1, steps + 1)]
+        if limits is None:
+            return angles
+        peak = max(abs(b - a) for a, b in zip([start] + angles, angles)) * rate
+        if peak <= limits.max_speed + 1e-9:
+            return angles
+        steps = int(math.ceil(steps * peak / limits.max_speed))  # Too fast, spread over more ticks
+
+
+class SimulatedServoBackend:
+    """
+    Records every commanded angle as (time, servo_id, angle) instead of driving hardware.
+    A hardware backend only needs the same write(servo_id, angle) and release() methods.
+    """
+
+    def __init__(self):
+        self.timeline = []
+        self.angles = {}
+
+    def write(self, servo_id, angle):
+        self.angles[servo_id] = angle
+        self.timeline.append((time.monotonic(), servo_id, angle))
+
+    def release(self):
+        self.timeline.append((time.monotonic(), None, None))
+
+
+class Move:
+    """
+    Handle for a running move, wait() blocks until every servo in it has arrived (or been stopped).
+    """
+
+    def __init__(self, trajectories):
+        self.trajectories = trajectories  # servo_id -> list of angles
+        self.length = max(len(angles) for angles in trajectories.values())
+        self.tick = 0
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+
+class MotionEngine:
+    """
+    Drives servos from a fixed-rate control loop on its own thread.
+    Moves are turned into per-tick angle arrays up front, so the loop only indexes them and writes.
+    - servos in one move start on the same tick and, having equal-length arrays, arrive together
+    - angles are clamped and speeds limited per servo (see ServoLimits)
+    - emergency_stop() drops every move and releases the backend until reset()
+    The loop records how late each tick ran, see jitter_stats().
+    """
+
+    def __init__(self, backend, limits=None, rate=CONTROL_RATE):
+        self.backend = backend
+        self.limits = limits or {}
+        self.rate = rate
+        self.positions = {}  # Last commanded angle per servo
+        self.moves = []
+        self.stopped = False
+        self.lock = threading.Lock()
+        self.lateness = []  # Seconds each tick ran after its scheduled time
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="motion", daemon=True)
+        self.thread.start()
+
+    def move_to_positions(self, position_map, duration, easing="ease_in_out"):
+        """
+        Move several servos together, position_map is servo_id -> target angle.
+        """
+        with self.lock:
+            if self.stopped:
+                raise RuntimeError("Motion engine is emergency stopped, call reset() first")
+            trajectories = {}
+            for servo_id, angle in position_map.items():
+                limits = self.limits.get(servo_id, ServoLimits())
+                start = self.positions.get(servo_id, limits.clamp(angle))
+                trajectories[servo_id] = build_trajectory(start, angle, duration, easing, self.rate, limits)
+
+            # Stretch everything to the slowest servo's tick count so they still arrive together.
+            # Repeated in case a speed limit stretches a rebuilt trajectory further still.
+            length = max(len(angles) for angles in trajectories.values())
+            while any(len(angles) != length for angles in trajectories.values()):
+                for servo_id, angles in trajectories.items():
+                    if len(angles) < length:
+                        start = self.positions.get(servo_id, angles[-1])
+                        limits = self.limits.get(servo_id, ServoLimits())
+                        trajectories[servo_id] = build_trajectory(
+                            start, angles[-1], None, easing, self.rate, limits, steps=length
+                        )
+                length = max(len(angles) for angles in trajectories.values())
+
+            # A new move takes over servos from any move already running
+            for move in self.moves:
+                for servo_id in trajectories:
+                    move.trajectories.pop(servo_id, None)
+            move = Move(trajectories)
+            self.moves.append(move)
+            return move
+
+    def set_servo_angle(self, servo_id, angle, duration, easing="ease_in_out"):
+        return self.move_to_positions({servo_id: angle}, duration, easing)
+
+    def emergency_stop(self):
+        with self.lock:
+            self.stopped = True
+            for move in self.moves:
+                move.done.set()
+            self.moves = []
+            self.backend.release()
+
+    def reset(self):
+        with self.lock:
+            self.stopped = False
+
+    def _run(self):
+        period = 1.0 / self.rate
+        next_tick = time.monotonic()
+        while self.running:
+            now = time.monotonic()
+            if now < next_tick:
+                time.sleep(next_tick - now)
+                now = time.monotonic()
+            self.lateness.append(now - next_tick)
+            if len(self.lateness) > 10000:
+                del self.lateness[:5000]
+            self._tick()
+            next_tick += period
+            if now - next_tick > period:
+                next_tick = now  # Fell more than a tick behind, don't try to catch up in a burst
+
+    def _tick(self):
+        with self.lock:
+            for move in self.moves:
+                for servo_id, angles in move.trajectories.items():
+                    if move.tick < len(angles):
+                        angle = angles[move.tick]
+                        if self.positions.get(servo_id) != angle:
+                            self.backend.write(servo_id, angle)
+                            self.positions[servo_id] = angle
+                move.tick += 1
+                if move.tick >= move.length:
+                    move.done.set()
+            self.moves = [move for move in self.moves if not move.done.is_set()]
+
+    def jitter_stats(self):
+        """
+        How late control ticks ran, in milliseconds.
+        """
+        with self.lock:
+            lateness = sorted(self.lateness)
+        if not lateness:
+            return {"ticks": 0}
+        return {
+            "ticks": len(lateness),
+            "mean_ms": sum(lateness) / len(lateness) * 1000,
+            "p99_ms": lateness[int(len(lateness) * 0.99)] * 1000,
+            "max_ms": lateness[-1] * 1000,
+        }
+
+    def close(self):
+        self.running = False
+        self.thread.join(timeout=1)
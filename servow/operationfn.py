@@ -1,24 +1,91 @@
 import curses
 import time
 import os
-import google.generativeai as genai
-from dotenv import load_dotenv
 import json
 import re
-from playsound import playsound
-import pygame
+import asyncio
+import threading
+from functools import partial
 
-def playsoundct(file):
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+
+from poolfn import QuestionPool
+from cachefn import QuestionCache
+from soundfn import sound_bank, PRIORITY_UI
+from schedulefn import read_key
+from streamfn import IncrementalJSONParser
+from clientfn import get_client, DEFAULT_DEADLINE
+from tracefn import metrics
+from quotafn import INTERACTIVE, BACKGROUND
+from dispensefn import DispenseTransport, DispenseResult, FakeDispenser
+from motionfn import MotionEngine, SimulatedServoBackend
+from servicefn import QuestionServiceClient, ServiceUnavailable, REQUEST_MARGIN
+
+BATCH_SIZE = 3  # Questions asked for per background refill call
+LATENCY_BUDGET = 6.0  # Seconds to wait on a live fetch before serving from the cache
+CACHE_ONLY = os.getenv("SERVOW_CACHE_ONLY") == "1"  # Serve only from the cache, e.g. with no network at an event
 
-    full_path = f"servoSounds/{file}"  # Directory where sound files are located
-    
-    # Load and play the sound
-    sound = pygame.mixer.Sound(full_path)
-    sound.play()
+def playsoundct(file):
+    # Play the pre-decoded sound right away, for feedback on a key press; see soundfn.SoundBank
+    sound_bank.play(file, PRIORITY_UI)
 
 def send_dispense_command(stdscr):
     stdscr.addstr(0, 0, "DISPENSING")
-    print("dispense called, pseudo serial communicated")
+    return dispense().result()
+
+dispenser = None
+fake_dispenser = None
+dispenser_lock = threading.Lock()
+
+def get_dispenser():
+    """
+    The serial dispense transport on SERVOW_DISPENSER_PORT, or on a pty stand-in device with
+    SERVOW_DISPENSER_PORT=fake. Raises OSError if the port isn't set or can't be opened.
+    """
+    global dispenser, fake_dispenser
+    with dispenser_lock:
+        if dispenser is None:
+            port = os.getenv("SERVOW_DISPENSER_PORT")
+            if not port:
+                raise OSError("SERVOW_DISPENSER_PORT is not set")
+            if port == "fake":
+                fake_dispenser = fake_dispenser or FakeDispenser()
+                port = fake_dispenser.port
+            dispenser = DispenseTransport(port)
+        return dispenser
+
+# Queue a dispense command without waiting, returns a Future for its dispensefn.DispenseResult
+def dispense(count=1):
+    try:
+        return get_dispenser().submit(count)
+    except OSError as e:
+        # No dispenser (unset or wrong port, adapter unplugged), fail this dispense and try again next time
+        future = Future()
+        future.set_result(DispenseResult(False, None, 0, 0.0, f"dispenser unavailable: {e}"))
+        return future
+
+motion_engine = None
+motion_lock = threading.Lock()
+
+def get_motion_engine():
+    """
+    The shared motion engine, driving a simulated servo backend until hardware is wired in.
+    """
+    global motion_engine
+    with motion_lock:
+        if motion_engine is None:
+            motion_engine = MotionEngine(SimulatedServoBackend())
+        return motion_engine
+
+# Servo motion primitives, see motionfn.MotionEngine. Each returns a Move handle to wait() on.
+def set_servo_angle(servo_id, angle, duration, easing="ease_in_out"):
+    return get_motion_engine().set_servo_angle(servo_id, angle, duration, easing)
+
+def move_to_positions(position_map, duration, easing="ease_in_out"):
+    return get_motion_engine().move_to_positions(position_map, duration, easing)
+
+def emergency_stop():
+    get_motion_engine().emergency_stop()
 
 # Reset hardware states or UI
 def reset_states():
@@ -29,16 +96,27 @@ def reset_states():
     """
     curses.endwin()  # Close curses UI
 
-# Send AI prompt to Gemini API
-def get_questions_from_api(subject, difficulty, scale):
-    """
-    Fetch questions from the Gemini API based on the selected subject.
-    """
-    load_dotenv(dotenv_path='keys.env')
-    api_key = os.getenv("GEMINI_API_KEY")
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+# Check a parsed question has everything the question screens need
+def validate_question(question):
+    if not isinstance(question, dict):
+        return False
+    options = question.get("options")
+    return (
+        isinstance(question.get("question"), str)
+        and isinstance(options, dict)
+        and len(options) == 4
+        and question.get("correct_answer") in options
+        and isinstance(question.get("explanation"), str)
+    )
+
+# Question prompt, shared by single and batch fetches
+def build_question_prompt(subject, difficulty, scale, count=1):
+    if count == 1:
+        intro = f"Generate one completely random multiple-choice question based on the subject {subject} with difficulty {difficulty} on a scale of 1-[{scale}]."
+    else:
+        intro = f"Generate {count} completely random multiple-choice questions based on the subject {subject} with difficulty {difficulty} on a scale of 1-[{scale}], each on a different subtopic."
 
-    payload = f"""Generate one completely random multiple-choice question based on the subject {subject} with difficulty {difficulty} on a scale of 1-[{scale}]. 
+    guidelines = f"""
 
                 - Difficulty levels should follow this structure:
                 1. The first few levels (1 to 3) should be IGCSE level questions.
@@ -60,39 +138,89 @@ def get_questions_from_api(subject, difficulty, scale):
 
                 - Add a brief explanation for the correct answer, covering both why it is correct and why the other options are wrong.
 
-                Format the output in JSON as follows:
-                {{
+                """
+
+    if count == 1:
+        output_format = """Format the output in JSON as follows:
+                {
                     "question": "Insert question here",
-                    "options": {{
+                    "options": {
                         "A": "Option A text",
                         "B": "Option B text",
                         "C": "Option C text",
                         "D": "Option D text"
-                    }},
+                    },
                     "correct_answer": "Insert correct option (A/B/C/D)",
                     "explanation": "Explanation on why it's the correct answer and why others are incorrect."
-                }}
+                }
 
                 **Reply only with the JSON object**. 
                 - Do not include any additional text, comments, or formatting like `'''json`.
                 - Start the output with open curly braces and end with close curly braces.
                 """
+    else:
+        output_format = f"""Format the output as a JSON array of {count} objects, each as follows:
+                [
+                    {{
+                        "question": "Insert question here",
+                        "options": {{
+                            "A": "Option A text",
+                            "B": "Option B text",
+                            "C": "Option C text",
+                            "D": "Option D text"
+                        }},
+                        "correct_answer": "Insert correct option (A/B/C/D)",
+                        "explanation": "Explanation on why it's the correct answer and why others are incorrect."
+                    }}
+                ]
+
+                **Reply only with the JSON array**.
+                - Do not include any additional text, comments, or formatting like `'''json`.
+                - Start the output with an open square bracket and end with a close square bracket.
+                """
+
+    return intro + guidelines + output_format
+
+# Send AI prompt to Gemini API
+def fetch_question(subject, difficulty, scale, on_field=None, priority=INTERACTIVE):
+    """
+    Fetch a question live from the Gemini API based on the selected subject.
+    With on_field the response is streamed and on_field(path, value) is called from this
+    thread as each field completes, see streamfn.IncrementalJSONParser.
+    priority is INTERACTIVE when a customer is waiting, BACKGROUND for prefetching (see quotafn).
+    """
+    payload = build_question_prompt(subject, difficulty, scale)
 
     try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response = model.generate_content(payload)
+        client = get_client()  # Shared client with deadlines and retries, see clientfn.ModelClient
+        if on_field is None:
+            response_text = client.generate(payload, priority=priority)
+        else:
+            parser = IncrementalJSONParser()
+            chunks = []
+            for chunk in client.stream(payload, priority=priority):
+                chunks.append(chunk)
+                for path, value in parser.feed(chunk):
+                    on_field(path, value)
+            response_text = "".join(chunks)
 
         # Extract the JSON string and remove leading/trailing whitespace
-        json_string = response.text.strip() # Access text directly
+        json_string = response_text.strip()
 
         cleaned_response = re.search(r"\{.*\}", json_string, re.DOTALL)
 
         if cleaned_response:
             json_content = cleaned_response.group()  # Extract the matched JSON
             try:
-                questions = parsed_json = json.loads(json_content)  # Parse JSON to check validity
+                parsed_json = json.loads(json_content)  # Parse JSON to check validity
                 print(json.dumps(parsed_json, indent=4))  # Pretty print the JSON
                 print("JSON successfully parsed")
+                # Same repairs as batch items, the question screens can't show anything else
+                questions = repair_question(parsed_json)
+                if questions is None:
+                    print("Question is missing fields the screens need")
+                    return None
+                question_cache.store(subject, difficulty, questions)
                 return questions
             except json.JSONDecodeError as e:
                 print(f"JSON Decode Error: {e}")
@@ -105,6 +233,216 @@ def get_questions_from_api(subject, difficulty, scale):
         print(f"Error fetching questions: {e}")
         return None
 
+# Fix the small mistakes the model makes in otherwise usable questions, None if it can't be saved
+def repair_question(item):
+    if not isinstance(item, dict):
+        return None
+    question = dict(item)
+    if "correct_answer" not in question and "answer" in question:
+        question["correct_answer"] = question.pop("answer")
+
+    # Options as a list, or with lowercase/padded keys
+    options = question.get("options")
+    if isinstance(options, list) and len(options) == 4:
+        options = dict(zip("ABCD", options))
+    if isinstance(options, dict):
+        options = {str(key).strip().upper(): str(value) for key, value in options.items()}
+    question["options"] = options
+
+    # Answers like "b", "B)", "B. 4" or the option text itself
+    answer = str(question.get("correct_answer", "")).strip()
+    if isinstance(options, dict) and answer not in options:
+        match = re.match(r"^([A-Da-d])(?:[).:\s]|$)", answer)
+        if match:
+            answer = match.group(1).upper()
+        else:
+            answer = next((key for key, value in options.items() if value.strip() == answer), answer)
+    question["correct_answer"] = answer
+
+    return question if validate_question(question) else None
+
+# Pull every complete question object out of a response, even if the array around them is broken
+def parse_question_items(text):
+    decoder = json.JSONDecoder()
+    items = []
+    position = text.find("{")
+    while position != -1:
+        try:
+            item, end = decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            position = text.find("{", position + 1)
+            continue
+        items.append(item)
+        position = text.find("{", end)
+    return items
+
+def fetch_question_batch(subject, difficulty, scale, count):
+    """
+    Fetch count questions in one call. Each item is repaired/validated on its own, so one bad
+    item doesn't sink the rest. Returns the usable questions (possibly an empty list).
+    """
+    payload = build_question_prompt(subject, difficulty, scale, count)
+    start = time.perf_counter()
+    try:
+        response_text, usage = get_client().generate(payload, with_usage=True, priority=BACKGROUND)
+    except Exception as e:
+        print(f"Error fetching question batch: {e}")
+        return []
+    elapsed = time.perf_counter() - start
+
+    items = parse_question_items(response_text)
+    questions = [question for question in map(repair_question, items) if question is not None]
+    for question in questions:
+        question_cache.store(subject, difficulty, question)
+    # Per batch size: seconds and tokens per usable question are question_batch_seconds_total and
+    # question_batch_tokens_total over question_batch_items_total{result="usable"}
+    metrics.count("question_batch_items_total", len(questions), size=count, result="usable")
+    metrics.count("question_batch_items_total", max(count - len(questions), 0), size=count, result="lost")
+    metrics.count("question_batch_seconds_total", elapsed, size=count)
+    metrics.count("question_batch_tokens_total", usage["prompt_tokens"] + usage["output_tokens"], size=count)
+    return questions
+
+# Every good question is kept on disk, see cachefn.QuestionCache
+question_cache = QuestionCache()
+live_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="live-fetch")
+
+def use_live_workers(count):
+    # The question service runs every kiosk's live fetches through this pool, see servicefn.main
+    global live_executor
+    live_executor = ThreadPoolExecutor(max_workers=count, thread_name_prefix="live-fetch")
+
+def fetch_question_within_budget(subject, difficulty, scale, on_field=None):
+    """
+    Fetch a question live, but serve a cached one if the call fails or takes longer than LATENCY_BUDGET.
+    The budget starts when the call does, time queued behind other live fetches doesn't count
+    (though a call still queued after LATENCY_BUDGET is given up on too).
+    A live call that overruns the budget still finishes in the background and lands in the cache.
+    on_field stops being called once a cached question is served instead, the caller has to redraw.
+    """
+    if CACHE_ONLY:
+        return question_cache.lookup(subject, difficulty)
+
+    started = threading.Event()
+    started_at = []
+    abandoned = threading.Event()
+
+    def forward(path, value):
+        if not abandoned.is_set():
+            on_field(path, value)
+
+    def run():
+        started_at.append(time.monotonic())
+        started.set()
+        return fetch_question(subject, difficulty, scale, forward if on_field else None)
+
+    future = live_executor.submit(run)
+    questions = None
+    if not started.wait(LATENCY_BUDGET):
+        print(f"Live fetch queued over {LATENCY_BUDGET}s, serving from cache")
+    else:
+        try:
+            questions = future.result(timeout=LATENCY_BUDGET)
+        except TimeoutError:
+            print(f"Live fetch over {LATENCY_BUDGET}s budget, serving from cache")
+    if questions:
+        return questions
+
+    cached = question_cache.lookup(subject, difficulty)
+    if cached is None and not future.done():
+        # Nothing cached yet, so the live call is all we have, though never past the client's deadline
+        end = (started_at[0] if started_at else time.monotonic()) + DEFAULT_DEADLINE
+        try:
+            return future.result(timeout=max(end - time.monotonic(), 0))
+        except TimeoutError:
+            print("Live fetch never finished, nothing cached to serve")
+    abandoned.set()
+    return cached
+
+# Ready questions are prefetched in the background, see poolfn.QuestionPool
+question_pool = QuestionPool(
+    partial(fetch_question, priority=BACKGROUND), validate_question, live=fetch_question_within_budget,
+    fetch_batch=fetch_question_batch, batch_size=BATCH_SIZE,
+)
+metrics.add_collector(question_pool.collect_metrics)  # Depth per key in servow.prom, for sizing the pool
+
+# Shared service for multi-kiosk venues, see servicefn. Its slowest answer is a live fetch that
+# overran the budget and then had to run out the client's deadline, don't give up before that.
+question_service = QuestionServiceClient(timeout=LATENCY_BUDGET + DEFAULT_DEADLINE + REQUEST_MARGIN)
+
+def get_questions_from_api(subject, difficulty, scale, on_field=None):
+    """
+    Get a question for the selected subject from the shared question service if one is running,
+    else from the local prefetch pool. If it has to be fetched live locally, on_field is passed
+    through to fetch_question for streaming.
+    """
+    if question_service.available():
+        try:
+            return question_service.question(subject, difficulty, scale)
+        except ServiceUnavailable as e:
+            print(f"{e}, fetching directly")
+    return question_pool.get(subject, difficulty, scale, on_field=on_field)
+
+def warm_questions(scale):
+    # The service keeps its own pool warm, only prefetch locally when it isn't reachable
+    if question_service.available():
+        try:
+            question_service.stats()
+            return
+        except ServiceUnavailable:
+            pass
+    question_pool.warm(scale)
+
+# Menus draw and handle keys through shared helpers, so the blocking versions below and the
+# async ones used by the kiosk state machine behave the same.
+
+def draw_options(stdscr, options, current_index):
+    stdscr.addstr(0, 0, "Use UP/DOWN keys to scroll and ENTER to select:")
+    for i, option in enumerate(options):
+        if i == current_index:
+            stdscr.addstr(i + 2, 0, f"> {option}", curses.A_REVERSE)  # Highlight selected option
+        else:
+            stdscr.addstr(i + 2, 0, f"  {option}")
+    stdscr.refresh()
+
+def handle_option_key(key, current_index, count):
+    """
+    Returns (new index, True once ENTER selects it).
+    """
+    if key == curses.KEY_UP:
+        playsoundct("scroll.mp3")
+        return (current_index - 1) % count, False
+    elif key == curses.KEY_DOWN:
+        playsoundct("scroll.mp3")
+        return (current_index + 1) % count, False
+    elif key == 10:  # ENTER key
+        playsoundct("enter.mp3")
+        return current_index, True
+    return current_index, False
+
+def draw_number(stdscr, choice):
+    # Clear the screen and display instructions
+    stdscr.clear()
+    stdscr.addstr(0, 0, "Use UP/DOWN keys to scroll and ENTER to select:")
+
+    # Display the currently selected number
+    stdscr.addstr(2, 2, f"Difficulty: {choice}")
+    stdscr.refresh()
+
+def handle_number_key(key, choice, scale):
+    """
+    Returns (new choice, True once ENTER selects it), staying within 1-scale.
+    """
+    if key == curses.KEY_UP:
+        playsoundct("scroll.mp3")
+        return min(scale, choice + 1), False  # Increment but stay within bounds
+    elif key == curses.KEY_DOWN:
+        playsoundct("scroll.mp3")
+        return max(1, choice - 1), False  # Decrement but stay within bounds
+    elif key == 10:  # ENTER key
+        playsoundct("enter.mp3")
+        return choice, True
+    return choice, False
+
 # Scroll through options and get user choice
 def scroll_through_options(stdscr, options):
     """
@@ -113,51 +451,40 @@ def scroll_through_options(stdscr, options):
     current_index = 0
     time.sleep(1)
     while True:
-        # Display options
-        stdscr.addstr(0, 0, "Use UP/DOWN keys to scroll and ENTER to select:")
-        for i, option in enumerate(options):
-            if i == current_index:
-                stdscr.addstr(i + 2, 0, f"> {option}", curses.A_REVERSE)  # Highlight selected option
-            else:
-                stdscr.addstr(i + 2, 0, f"  {option}")
-        stdscr.refresh()
-
+        draw_options(stdscr, options, current_index)
         key = stdscr.getch() # record keypress
-
-        # Handle key presses
-        if key == curses.KEY_UP:
-            playsoundct("scroll.mp3")
-            current_index = (current_index - 1) % len(options)
-        elif key == curses.KEY_DOWN:
-            playsoundct("scroll.mp3")
-            current_index = (current_index + 1) % len(options)
-        elif key == 10:  # ENTER key
-            playsoundct("enter.mp3")
-            return current_index  # Return the selected 
+        current_index, selected = handle_option_key(key, current_index, len(options))
+        if selected:
+            return current_index  # Return the selected
 
 def scroll_through_numbers(stdscr, scale):
     choice = 1  # Start at 1
-    min_choice, max_choice = 1, scale  # Define the range of choices
-
     while True:
-        # Clear the screen and display instructions
-        stdscr.clear()
-        stdscr.addstr(0, 0, "Use UP/DOWN keys to scroll and ENTER to select:")
-        
-        # Display the currently selected number
-        stdscr.addstr(2, 2, f"Difficulty: {choice}")
-        stdscr.refresh()
-
-        # Get user input
+        draw_number(stdscr, choice)
         key = stdscr.getch()
+        choice, selected = handle_number_key(key, choice, scale)
+        if selected:
+            return choice  # Return the selected number
+
+async def scroll_through_options_async(stdscr, options, input_fd=None):
+    """
+    scroll_through_options for the asyncio kiosk loop, other tasks keep running while it waits for keys.
+    input_fd is passed on to read_key.
+    """
+    current_index = 0
+    await asyncio.sleep(1)
+    while True:
+        draw_options(stdscr, options, current_index)
+        key = await read_key(stdscr, input_fd)
+        current_index, selected = handle_option_key(key, current_index, len(options))
+        if selected:
+            return current_index
 
-        # Handle key presses
-        if key == curses.KEY_UP:
-            playsoundct("scroll.mp3")
-            choice = min(max_choice, choice + 1)  # Increment but stay within bounds
-        elif key == curses.KEY_DOWN:
-            playsoundct("scroll.mp3")
-            choice = max(min_choice, choice - 1)  # Decrement but stay within bounds
-        elif key == 10:  # ENTER key
-            playsoundct("enter.mp3")
-            return choice  # Return the selected number 
+async def scroll_through_numbers_async(stdscr, scale, input_fd=None):
+    choice = 1
+    while True:
+        draw_number(stdscr, choice)
+        key = await read_key(stdscr, input_fd)
+        choice, selected = handle_number_key(key, choice, scale)
+        if selected:
+            return choice
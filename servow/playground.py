@@ -2,21 +2,22 @@ import pygame
 from playsound import playsound
 import time
 
+from soundfn import sound_bank, measure_play_latency
+
 # Initialize Pygame mixer
 pygame.mixer.init()
+print(f"Sound bank decoded in {sound_bank.load():.2f}s")
 
 def playsoundct(file):
-
-    full_path = f"servoSounds/{file}"  # Directory where sound files are located
-    
-    # Load and play the sound
-    sound = pygame.mixer.Sound(full_path)
-    sound.play()
+    sound_bank.play(file)
 
 playsound("servoSounds/enter.mp3")
 playsoundct("menu.mp3")
 playsoundct("correct.mp3")
 
+# Key-to-sound latency, old per-call load versus the sound bank
+print(measure_play_latency(sound_bank))
+
 for i in range(30):
     print(f"Doing something else... {i}")
-    time.sleep(1)
\ No newline at end of file
+    time.sleep(1)
@@ -0,0 +1,158 @@
+import threading
+from collections import Counter, defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from tracefn import metrics
+
+
+class QuestionPool:
+    """
+    Keeps a few ready, validated questions per (subject, difficulty) so a session
+    doesn't have to wait on a live API round trip.
+    - fetch(subject, difficulty, scale) does the live call and returns a question dict or None.
+    - validate(question) decides whether a fetched question is good enough to keep.
+    - live(subject, difficulty, scale) is used on a miss instead of fetch, if given.
+    - fetch_batch(subject, difficulty, scale, count) returns a list of questions; if given, a refill
+      is one call for at least batch_size questions instead of one call per question.
+    Concurrent misses on one key share a single live fetch, but each caller still takes its own
+    ready question when there is one.
+    """
+
+    def __init__(self, fetch, validate, depth=2, workers=2, live=None, fetch_batch=None, batch_size=1):
+        self.fetch = fetch
+        self.live = live or fetch
+        self.fetch_batch = fetch_batch
+        self.batch_size = batch_size
+        self.validate = validate
+        self.depth = depth  # Ready questions to keep per (subject, difficulty)
+        self.ready = defaultdict(deque)
+        self.in_flight = Counter()  # Background fills currently running per key
+        self.picks = Counter()  # How often each key has been asked for
+        self.live_calls = {}  # key -> Future of the live fetch a miss is waiting on
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0  # Misses that waited on another caller's live fetch
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+
+    def get(self, subject, difficulty, scale, **live_kwargs):
+        """
+        Serve a question from the pool, falling back to a live fetch on a miss
+        (live_kwargs are only passed to that live fetch).
+        Either way the key is topped back up in the background.
+        """
+        key = (subject, difficulty)
+        shared = own = None
+        with self.lock:
+            self.picks[key] += 1
+            question = self.ready[key].popleft() if self.ready[key] else None
+            if question is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                shared = self.live_calls.get(key)
+                if shared is None:
+                    own = self.live_calls[key] = Future()
+                else:
+                    self.coalesced += 1
+        metrics.count("question_pool_lookups_total", result="hit" if question is not None else "miss")
+
+        if own is not None:
+            try:
+                question = self.live(subject, difficulty, scale, **live_kwargs)
+                own.set_result(question)
+            except Exception as e:
+                own.set_exception(e)
+                raise
+            finally:
+                with self.lock:
+                    del self.live_calls[key]
+        elif shared is not None:
+            question = shared.result()
+            with self.lock:
+                if self.ready[key]:
+                    question = self.ready[key].popleft()  # A refill landed meanwhile, take a question of our own
+        self.refill(subject, difficulty, scale)
+        return question
+
+    def refill(self, subject, difficulty, scale):
+        """
+        Schedule enough background fetches to bring a key back up to depth.
+        """
+        key = (subject, difficulty)
+        with self.lock:
+            needed = self.depth - len(self.ready[key]) - self.in_flight[key]
+            if needed > 0 and self.fetch_batch is not None:
+                needed = max(needed, self.batch_size)
+            self.in_flight[key] += max(needed, 0)
+        if needed <= 0:
+            return
+        if self.fetch_batch is not None:
+            self.executor.submit(self._fill_batch, subject, difficulty, scale, needed)
+        else:
+            for _ in range(needed):
+                self.executor.submit(self._fill, subject, difficulty, scale)
+
+    def warm(self, scale, keys=None, top=3):
+        """
+        Top up the most-picked keys (or an explicit list of (subject, difficulty) keys).
+        Cheap to call repeatedly, e.g. every time the attract loop starts.
+        """
+        if keys is None:
+            with self.lock:
+                keys = [key for key, _ in self.picks.most_common(top)]
+        for subject, difficulty in keys:
+            self.refill(subject, difficulty, scale)
+
+    def _fill(self, subject, difficulty, scale):
+        key = (subject, difficulty)
+        try:
+            question = self.fetch(subject, difficulty, scale)
+        except Exception as e:
+            print(f"Prefetch failed for {key}: {e}")
+            question = None
+        with self.lock:
+            self.in_flight[key] -= 1
+            if question is not None and self.validate(question):
+                self.ready[key].append(question)
+
+    def _fill_batch(self, subject, difficulty, scale, count):
+        key = (subject, difficulty)
+        try:
+            questions = self.fetch_batch(subject, difficulty, scale, count)
+        except Exception as e:
+            print(f"Batch prefetch failed for {key}: {e}")
+            questions = []
+        with self.lock:
+            self.in_flight[key] -= count
+            self.ready[key].extend(question for question in questions if self.validate(question))
+
+    def stats(self):
+        """
+        Hit/miss counts and current pool depth, for sizing the pool against queue lengths.
+        """
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": self.hits / total if total else 0.0,
+                "depth": {f"{s}/{d}": len(q) for (s, d), q in self.ready.items() if q},
+                "total_depth": sum(len(q) for q in self.ready.values()),
+                "in_flight": sum(self.in_flight.values()),
+            }
+
+    def collect_metrics(self):
+        """
+        Ready questions per key as gauges, for tracefn.Metrics.add_collector.
+        """
+        with self.lock:
+            depths = {key: len(ready) for key, ready in self.ready.items()}
+            in_flight = sum(self.in_flight.values())
+        for (subject, difficulty), depth in depths.items():
+            metrics.gauge("question_pool_depth", depth, subject=subject, difficulty=difficulty)
+        metrics.gauge("question_pool_in_flight", in_flight)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
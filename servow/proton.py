@@ -1,237 +1,545 @@
+from startfn import Startup  # First, so the boot clock includes the imports below
+
+import asyncio
+import contextlib
 import curses
 import time
 import os
-import google.generativeai as genai
-from dotenv import load_dotenv
-from playsound import playsound
-import pygame
+import threading
+import sys
 
 from operationfn import (
-    send_dispense_command,
+    dispense,
     reset_states,
     get_questions_from_api,
-    scroll_through_options,
-    scroll_through_numbers,
+    scroll_through_options_async,
+    scroll_through_numbers_async,
     playsoundct,
+    warm_questions,
 )
+from soundfn import sound_bank, SOUND_DIR, MIXER_BUFFER
+from timelinefn import timeline
+from renderfn import Renderer
+from schedulefn import FrameScheduler, read_key, POLL_INTERVAL, ENTER_KEYS
+from streamfn import TextStream
+from clientfn import get_client
+from farewellfn import farewell_pool
+from tracefn import metrics, open_log
+from framefn import blit, centered_frame, assets
+from replayfn import SessionRecorder
 from animatefn import (
-    display_scrolling_text,
-    fall_sugarservo,
-    blink_candy,
-    rise_sugarservo,
-    cascading_wave_effect,
+    cascading_wave_frames,
+    blink_candy_frames,
+    slide_sugarservo_frames,
 )
 
-# ASCII Art
-ascii_candy = r"""
+# ASCII Art, parsed once and laid out per terminal size by framefn.assets
+ascii_candy = assets.register("candy", r"""
                        ----'-..-'---
               \  "-.  /             \  .-"  /
                > -=.\/               \/.=- <
                > -='/\               /\'=- <
               /__.-'  \             /  '-.__\          
                        ----'-..-'---
-"""
-ascii_candyDispensing = r"""
+""")
+ascii_candyDispensing = assets.register("candy_dispensing", r"""
                        ----'-..-'---
               \  "-.  /             \  .-"  /
                > -=.\/   DISPENSING!   \/.=- <
                > -='/\   /-/-/-/-/-    /\'=- <
               /__.-'  \             /  '-.__\          
                        ----'-..-'---
-"""
-ascii_sugarservo = r"""
+""")
+ascii_sugarservo = assets.register("sugarservo", r"""
  ______  __  __  ______  ______  ______       ______  ______  ______  __   ________    
 /\  ___\/\ \/\ \/\  ___\/\  __ \/\  == \     /\  ___\/\  ___\/\  == \/\ \ / /\  __ \   
 \ \___  \ \ \_\ \ \ \__ \ \  __ \ \  __<     \ \___  \ \  __\\ \  __<\ \ \'/\ \ \/\ \  
  \/\_____\ \_____\ \_____\ \_\ \_\ \_\ \_\    \/\_____\ \_____\ \_\ \_\ \__| \ \_____\ 
   \/_____/\/_____/\/_____/\/_/\/_/\/_/ /_/     \/_____/\/_____/\/_/ /_/\/_/   \/_____/ 
-"""
-ascii_stemclub = r"""
+""")
+ascii_stemclub = assets.register("stemclub", r"""
     _______.___________. _______ .___  ___.      ______  __       __    __  .______    __     _______.
     /       |           ||   ____||   \/   |     /      ||  |     |  |  |  | |   _  \  (_ )   /       |
     |   (----`---|  |----`|  |__   |  \  /  |    |  ,----'|  |     |  |  |  | |  |_)  |  |/   |   (----`
     \   \       |  |     |   __|  |  |\/|  |    |  |     |  |     |  |  |  | |   _  <         \   \    
     .----)   |      |  |     |  |____ |  |  |  |    |  `----.|  `----.|  `--'  | |  |_)  |    .----)   |   
     |_______/       |__|     |_______||__|  |__|     \______||_______| \______/  |______/     |_______/  
-    """
+    """)
 
-# Load environment variables
-load_dotenv(dotenv_path='keys.env')
-api_key = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-candyJokePrompt = "say a custom dental goodbye for using the xylitol vending machine service and a congrats for getting the question correct. your response will be directly printed in the program"
-model = genai.GenerativeModel("gemini-1.5-flash")
+# Session states, see Kiosk
+ATTRACT = "attract"
+WELCOME = "welcome"
+SUBJECT = "subject"
+DIFFICULTY = "difficulty"
+FETCH = "fetch"
+QUESTION = "question"
+CORRECT = "correct"
+INCORRECT = "incorrect"
+DISPENSE_PROMPT = "dispense_prompt"
+DISPENSING = "dispensing"
+FAREWELL = "farewell"
 
-pygame.mixer.init()
-playsound(r'servoSounds/correct.mp3') #check speaker functionality upon boot
+subjects = ["bio", "chem", "phys", "pure math", "mechanics", "statistics", "business", "econ", "acct", "compsci", "history trivia", "pop culture", "mechanics uestion "]
+scale = 8  # Difficulty scale
+DISPENSING_SOUNDS = ["dispensing2.mp3", "dispensing.mp3"]  # Cued back to back while the candy dispenses
+TYPE_DELAY = 0.01  # Seconds per character when typing out streamed text
 
-def main(stdscr):
-    curses.curs_set(0)  # Hide the cursor
-    #colours
-    curses.start_color()
-    curses.init_pair(1, curses.COLOR_WHITE, curses.COLOR_BLUE)   # white text on black
-    cinstructional = curses.color_pair(1)
-    while True:
-        try:
-            # Set timeout for key press detection (in milliseconds)
-            key = 0
-            stdscr.nodelay(True)  # Set non-blocking mode
-
-            try:
-                while key not in [curses.KEY_ENTER, 10, 13]:  # Wait for Enter key
-                    # Display animations
-                    cascading_wave_effect(stdscr, ascii_stemclub, 3)
-                    if stdscr.getch() in [curses.KEY_ENTER, 10, 13]:  # Check for Enter during animation
-                        break
-                    blink_candy(stdscr, ascii_candy)
-                    if stdscr.getch() in [curses.KEY_ENTER, 10, 13]:
-                        break
-                    rise_sugarservo(stdscr, ascii_sugarservo)
-                    if stdscr.getch() in [curses.KEY_ENTER, 10, 13]:
-                        break
-            finally:
-                stdscr.nodelay(False)  # Restore blocking mode
-
-            # Display welcome message
-            stdscr.clear()
-            stdscr.addstr(0, 0, "Welcome to the Sugar Servo!")
-            stdscr.refresh()
-            time.sleep(1)
-
-            # Subject menu
-            playsoundct("menu.mp3")
-            subjects = ["bio", "chem", "phys", "pure math", "mechanics", "statistics", "business", "econ", "acct", "compsci", "history trivia", "pop culture", "mechanics uestion "]
-            stdscr.addstr(1, 0, "Select a subject:",cinstructional)
-            stdscr.refresh()
-            time.sleep(1)
-            selected_subject_index = scroll_through_options(stdscr, subjects)
-            selected_subject = subjects[selected_subject_index]
-
-            # Select difficulty
-            scale = 8
+# Seconds without input before the attract loop steps down to idle level 1, then 2
+IDLE_AFTER = tuple(float(s) for s in os.getenv("SERVOW_IDLE_AFTER", "60,300").split(","))
+IDLE_HOLD = 8.0  # Seconds each still frame stays up at the deepest idle level
+ATTRACT_FLUSH = 60.0  # Seconds between metrics flushes while nobody is using the kiosk
+
+def idle_level(idle_seconds):
+    return sum(idle_seconds >= threshold for threshold in IDLE_AFTER)
+
+def attract_frames(stdscr, level=0):
+    # One pass of the attract animations as a single frame generator, cheaper at each idle level
+    if level == 0:
+        yield from cascading_wave_frames(stdscr, ascii_stemclub, 3)
+        yield from blink_candy_frames(stdscr, ascii_candy)
+        yield from slide_sugarservo_frames(stdscr, ascii_sugarservo, rising=True)
+    elif level == 1:
+        # No wave (the costliest effect) and half the frame rate
+        yield from blink_candy_frames(stdscr, ascii_candy, delay=0.2)
+        yield from slide_sugarservo_frames(stdscr, ascii_sugarservo, rising=True, delay=0.2)
+    else:
+        # Still frames, the renderer has nothing to send between them
+        for art in (ascii_stemclub, ascii_sugarservo):
             stdscr.clear()
-            stdscr.addstr(1, 0, f"Select difficulty from 1-{scale}:", cinstructional)
-            difficulty = scroll_through_numbers(stdscr, scale)
-            stdscr.addstr(4, 0, f"Difficulty selected {difficulty}")
-
-            # Fetch questions from API
-            questions = get_questions_from_api(selected_subject, difficulty, scale)
-            if not questions:
-                stdscr.addstr(4, 0, "Failed to fetch questions. Exiting.")
-                stdscr.refresh()
-                time.sleep(2)
-                continue
-
-            # Question loop
-            question = questions["question"]
-            options = questions["options"]
-            correct_answer = questions["correct_answer"]
-
-            # Prepare a list for dynamic navigation
-            slides = [question] + [f"{key}: {value}" for key, value in options.items()]
-            current_slide = 0
+            blit(stdscr, centered_frame(art, *stdscr.getmaxyx()))
+            yield IDLE_HOLD
+
+class KioskServices:
+    """
+    The kiosk's calls out to the world, all blocking and run off the event loop.
+    replayfn swaps in recorded ones.
+    """
+
+    def warm(self, scale):
+        warm_questions(scale)
+        farewell_pool.refill()
+
+    def question(self, subject, difficulty, scale, on_field=None):
+        return get_questions_from_api(subject, difficulty, scale, on_field)
+
+    def farewell(self, stream):
+        # Pre-generated, see farewellfn.FarewellPool, so it's there as soon as the answer is marked
+        text = farewell_pool.take()
+        print(text)
+        stream.push(text)
+        stream.finish()
+
+    def dispense(self):
+        return dispense()  # concurrent Future of a dispensefn.DispenseResult
+
+    def reset(self):
+        reset_states()
+
+class Kiosk:
+    """
+    One customer session as an explicit state machine on asyncio.
+    Each state is a coroutine returning the next state. Slow I/O (Gemini calls, the dispense
+    command) runs in tasks so the screen keeps animating and input keeps being read meanwhile,
+    e.g. the candy keeps blinking while the dispense command is in flight. Background tasks are
+    kept in self.tasks and awaited before the session ends, except the attract-loop warm-up.
+    """
+
+    def __init__(self, stdscr, cinstructional, services=None, recorder=None, input_fd=None):
+        self.stdscr = stdscr
+        self.cinstructional = cinstructional
+        self.services = services or KioskServices()
+        self.recorder = recorder  # replayfn.SessionRecorder when recording sessions
+        self.last_outcome = None
+        self.input_fd = input_fd  # Terminal input, so waits for keys sleep on it instead of polling
+        self.scheduler = FrameScheduler(stdscr, input_fd=input_fd)
+        self.tasks = set()  # Background calls still running, see start_task
+        self.unsettled = set()  # Those of them the session doesn't wait for
+        self.warm_task = None
+        self.handlers = {
+            ATTRACT: self.attract,
+            WELCOME: self.welcome,
+            SUBJECT: self.subject,
+            DIFFICULTY: self.difficulty,
+            FETCH: self.fetch,
+            QUESTION: self.question,
+            CORRECT: self.correct,
+            INCORRECT: self.incorrect,
+            DISPENSE_PROMPT: self.dispense_prompt,
+            DISPENSING: self.dispensing,
+            FAREWELL: self.farewell,
+        }
+
+    async def run(self, sessions=None):
+        """
+        Run sessions back to back, forever or until the given number have finished.
+        """
+        state = ATTRACT
+        finished = 0
+        while sessions is None or finished < sessions:
+            if state == ATTRACT:
+                metrics.start_session()
+                if self.recorder:
+                    self.recorder.start_session(*self.stdscr.getmaxyx())
+            with metrics.span(state):
+                next_state = await self.handlers[state]()
+            if state != ATTRACT and next_state == ATTRACT:
+                self.last_outcome = state
+                finished += 1
+                metrics.count("sessions_total", outcome=state)
+                await self.settle_tasks()
+                if self.recorder:
+                    self.recorder.end_session(state)
+                await asyncio.to_thread(metrics.flush)
+                self.services.reset()  # Cleanup after each session
+            state = next_state
+
+    def start_task(self, fn, *args, settle=True):
+        # Run a blocking call off the loop. The reference kept here stops the task from being
+        # garbage collected mid-run, and _task_done reports its error instead of dropping it.
+        # settle=False leaves it out of settle_tasks, it just finishes whenever it does.
+        task = asyncio.create_task(asyncio.to_thread(fn, *args))
+        self.tasks.add(task)
+        if not settle:
+            self.unsettled.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task):
+        self.tasks.discard(task)
+        self.unsettled.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Background task failed: {task.exception()!r}")
+            metrics.count("task_errors_total")
+
+    async def settle_tasks(self):
+        # Wait out whatever the session started, errors were already reported by _task_done
+        tasks = self.tasks - self.unsettled
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def reset_session(self):
+        self.selected_subject = None
+        self.selected_difficulty = None
+        self.questions = None
+        self.farewell_stream = None
+        self.farewell_task = None
+        self.dispensed = False
+
+    async def attract(self):
+        self.reset_session()
+        # Prefetch the most-picked questions while the animations run, off the loop as it may ask the service.
+        # That can take seconds, so sessions don't wait for it, and one warm-up runs at a time.
+        if self.warm_task is None or self.warm_task.done():
+            self.warm_task = self.start_task(self.services.warm, scale, settle=False)
+
+        # Attract loop until Enter, input is checked every frame. With nobody around it steps
+        # down to cheaper levels, and any key brings it straight back to full rate.
+        self.scheduler.reset_stats()
+        clock = asyncio.get_running_loop().time
+        self.scheduler.last_input = clock()  # The key that ended the last session
+        flushed, flushed_level = clock(), 0
+        while True:
+            level = idle_level(clock() - self.scheduler.last_input)
+            self.scheduler.wake_on_input = level > 0
+            start, cpu = clock(), time.process_time()
+            key = await self.scheduler.play_async(attract_frames(self.stdscr, level))
+            self._count_attract(level, clock() - start, time.process_time() - cpu)
+            if key in ENTER_KEYS:
+                break
+            # Sessions flush when they end, an idle kiosk has to write its figures out from here
+            if level != flushed_level or clock() - flushed >= ATTRACT_FLUSH:
+                await asyncio.to_thread(metrics.flush)
+                flushed, flushed_level = clock(), level
+        return WELCOME
+
+    def _count_attract(self, level, seconds, cpu):
+        # CPU share per idle level is attract_cpu_seconds_total / attract_seconds_total
+        metrics.count("attract_seconds_total", seconds, level=level)
+        metrics.count("attract_cpu_seconds_total", cpu, level=level)
+
+    async def welcome(self):
+        # Display welcome message
+        self.stdscr.clear()
+        self.stdscr.addstr(0, 0, "Welcome to the Sugar Servo!")
+        self.stdscr.refresh()
+        await asyncio.sleep(1)
+        return SUBJECT
+
+    async def subject(self):
+        # Subject menu
+        playsoundct("menu.mp3")
+        self.stdscr.addstr(1, 0, "Select a subject:", self.cinstructional)
+        self.stdscr.refresh()
+        await asyncio.sleep(1)
+        selected_subject_index = await scroll_through_options_async(self.stdscr, subjects, self.input_fd)
+        self.selected_subject = subjects[selected_subject_index]
+        return DIFFICULTY
+
+    async def difficulty(self):
+        # Select difficulty
+        self.stdscr.clear()
+        self.stdscr.addstr(1, 0, f"Select difficulty from 1-{scale}:", self.cinstructional)
+        self.selected_difficulty = await scroll_through_numbers_async(self.stdscr, scale, self.input_fd)
+        self.stdscr.addstr(4, 0, f"Difficulty selected {self.selected_difficulty}")
+        self.stdscr.refresh()
+        return FETCH
+
+    async def fetch(self):
+        # Fetch questions from API without freezing the screen. On a pool miss the response is
+        # streamed and the question is shown as soon as its field arrives.
+        loop = asyncio.get_running_loop()
+        fields = asyncio.Queue()
+
+        def on_field(path, value):
+            loop.call_soon_threadsafe(fields.put_nowait, (path, value))
 
+        task = asyncio.create_task(asyncio.to_thread(
+            self.services.question, self.selected_subject, self.selected_difficulty, scale, on_field
+        ))
+        options_loaded = 0
+        shown = None
+        while not task.done():
+            while not fields.empty():
+                path, value = fields.get_nowait()
+                if path == ("question",):
+                    shown = value
+                    self.stdscr.clear()
+                    self.stdscr.addstr(0, 0, value, curses.A_BOLD)
+                elif path[0] == "options":
+                    options_loaded += 1
+                    self.stdscr.addstr(8, 0, f"Loading options... ({options_loaded}/4)")
+                self.stdscr.refresh()
+            await asyncio.sleep(POLL_INTERVAL)
+
+        self.questions = task.result()
+        if shown is not None and (not self.questions or self.questions["question"] != shown):
+            # The live fetch ran over budget and a cached question was served instead, drop what streamed
+            self.stdscr.clear()
+            if self.questions:
+                self.stdscr.addstr(0, 0, self.questions["question"], curses.A_BOLD)
+            self.stdscr.refresh()
+        if not self.questions:
+            self.stdscr.addstr(4, 0, "Failed to fetch questions. Exiting.")
+            self.stdscr.refresh()
+            await asyncio.sleep(2)
+            return ATTRACT
+        return QUESTION
+
+    async def question(self):
+        question = self.questions["question"]
+        options = self.questions["options"]
+        correct_answer = self.questions["correct_answer"]
+
+        # Prepare a list for dynamic navigation
+        slides = [question] + [f"{key}: {value}" for key, value in options.items()]
+        current_slide = 0
+
+        while True:
+            # Clear and refresh the screen
+            self.stdscr.clear()
+
+            # Display the current slide
+            self.stdscr.addstr(0, 0, slides[current_slide], curses.A_BOLD if current_slide == 0 else curses.A_NORMAL)
+
+            # Add a prompt for navigation or selection
+            if current_slide == 0:
+                self.stdscr.addstr(8, 0, "Use arrow keys to navigate options. Press ENTER to select.")
+
+            # Refresh the screen
+            self.stdscr.refresh()
+
+            # Get user input
+            key = await read_key(self.stdscr, self.input_fd)
+
+            # Navigate slides
+            if key == curses.KEY_DOWN:
+                playsoundct("scroll.mp3")
+                current_slide = (current_slide + 1) % len(slides)
+            elif key == curses.KEY_UP:
+                playsoundct("scroll.mp3")
+                current_slide = (current_slide - 1) % len(slides)
+            elif key == curses.KEY_ENTER or key in [10, 13]:
+                # Handle selection, only evaluate if an option is selected
+                if current_slide > 0:
+                    selected_option = list(options.keys())[current_slide - 1]  # Map slide index to option key
+                    return CORRECT if selected_option == correct_answer else INCORRECT
+
+    async def correct(self):
+        # Correct answer logic, the farewell is picked from the pool while the customer reads the explanation
+        self.farewell_stream = TextStream()
+        self.farewell_task = self.start_task(self.services.farewell, self.farewell_stream)
+        playsoundct("correct.mp3")
+        self.stdscr.clear()
+        self.stdscr.addstr(4, 0, "Correct!", curses.A_BOLD | curses.A_UNDERLINE)
+        self.stdscr.addstr(5, 0, f"Explanation: {self.questions['explanation']}")
+        self.stdscr.addstr(12, 0, "[Press [ENTER] to continue]", self.cinstructional)
+        self.stdscr.refresh()
+        await asyncio.sleep(2)
+        await read_key(self.stdscr, self.input_fd)
+        playsoundct("enter.mp3")
+        return DISPENSE_PROMPT
+
+    async def incorrect(self):
+        # Incorrect answer logic
+        playsoundct("incorrect.mp3")
+        self.stdscr.clear()
+        self.stdscr.addstr(4, 0, "Incorrect!", curses.A_BOLD | curses.A_UNDERLINE)
+        self.stdscr.addstr(5, 0, f"Explanation: {self.questions['explanation']}")
+        self.stdscr.addstr(12, 0, "[press any key to continue]")
+        self.stdscr.refresh()
+        await read_key(self.stdscr, self.input_fd)
+        playsoundct("enter.mp3")
+        return ATTRACT
+
+    async def dispense_prompt(self):
+        self.stdscr.clear()
+        self.stdscr.refresh()
+        dispenseStates = ["no", "yes"]
+        self.stdscr.addstr(1, 0, "Dispense Candy?", curses.A_BOLD | curses.A_UNDERLINE)
+        self.stdscr.refresh()
+        dispenseindex = await scroll_through_options_async(self.stdscr, dispenseStates, self.input_fd)
+        if dispenseStates[dispenseindex] == "yes":
+            return DISPENSING
+        playsoundct("thankyou.mp3")
+        return FAREWELL
+
+    async def dispensing(self):
+        # The candy keeps blinking while the dispense command is in flight
+        result_future = asyncio.wrap_future(self.services.dispense())
+        self.stdscr.clear()
+        self.stdscr.refresh()
+        blinker = FrameScheduler(self.stdscr, stop_keys=())
+
+        # The dispensing sounds play one after the other, starting as the candy first shows (frame 1).
+        # The chain runs longer than a quick dispense, whatever is left is cut off when the state ends.
+        cues = {1: DISPENSING_SOUNDS}
+        try:
             while True:
-                # Clear and refresh the screen
-                stdscr.clear()
-                
-                # Display the current slide
-                stdscr.addstr(0, 0, slides[current_slide], curses.A_BOLD if current_slide == 0 else curses.A_NORMAL)
-
-                # Add a prompt for navigation or selection
-                if current_slide == 0:
-                    stdscr.addstr(8, 0, "Use arrow keys to navigate options. Press ENTER to select.")
-                
-                # Refresh the screen
-                stdscr.refresh()
-
-                # Get user input
-                key = stdscr.getch()
-
-                # Navigate slides
-                if key == curses.KEY_DOWN:
-                    playsoundct("scroll.mp3")
-                    current_slide = (current_slide + 1) % len(slides)
-                elif key == curses.KEY_UP:
-                    playsoundct("scroll.mp3")
-                    current_slide = (current_slide - 1) % len(slides)
-                elif key == curses.KEY_ENTER or key in [10, 13]:
-                    # Handle selection
-                    if current_slide > 0:  # Only evaluate if an option is selected
-                        selected_option = list(options.keys())[current_slide - 1]  # Map slide index to option key
-                        if selected_option == correct_answer:
-                            # Correct answer logic
-                            playsoundct("correct.mp3")
-                            stdscr.clear()
-                            stdscr.addstr(4, 0, "Correct!", curses.A_BOLD | curses.A_UNDERLINE)
-                            stdscr.addstr(5, 0, f"Explanation: {questions['explanation']}")
-                            stdscr.addstr(12, 0, "[Press [ENTER] to continue]", cinstructional)
-                            stdscr.refresh()
-                            time.sleep(2)
-                            key = stdscr.getch()
-                            playsoundct("enter.mp3")
-                            stdscr.clear()
-                            stdscr.refresh()
-                            dispenseStates = ["no","yes"]
-                            stdscr.addstr(1, 0, "Dispense Candy?", curses.A_BOLD | curses.A_UNDERLINE)
-                            stdscr.refresh()
-                            dispenseindex = scroll_through_options(stdscr, dispenseStates)
-                            dispense = dispenseStates[dispenseindex]
-                            if dispense == "yes":
-                                playsoundct("dispensing2.mp3")
-                                playsoundct("dispensing.mp3")
-                                send_dispense_command(stdscr)
-
-                                stdscr.clear()
-                                stdscr.refresh()
-                                blink_candy(stdscr, ascii_candyDispensing, 10, 0.25)
-                                #print dispensing status here for debug (serial comms)
-                                joke = model.generate_content(candyJokePrompt)
-                                print(joke.text)
-                                stdscr.clear()
-                                stdscr.addstr(3, 0, joke.text)
-                                stdscr.refresh()
-                                playsoundct("thankyou.mp3")
-                                time.sleep(2)
-                                stdscr.addstr(9, 0, "Thank you for using the SUGAR SERVO!",cinstructional)
-                                stdscr.addstr(10, 0, "[press any key to continue]")
-                                stdscr.refresh()
-                                stdscr.getch()
-                                playsoundct("enter.mp3")
-                            else:
-                                playsoundct("thankyou.mp3")
-                                joke = model.generate_content(candyJokePrompt)
-                                print(joke.text)
-                                stdscr.clear()
-                                stdscr.addstr(3, 0, joke.text)
-                                stdscr.refresh()
-                                time.sleep(2)
-                                stdscr.addstr(9, 0, "Thank you for using the SUGAR SERVO!",cinstructional)
-                                stdscr.addstr(10, 0, "[press any key to continue]")
-                                stdscr.refresh()
-                                stdscr.getch()
-                                playsoundct("enter.mp3")
-                            break
-                        else:
-                            # Incorrect answer logic
-                            playsoundct("incorrect.mp3")
-                            stdscr.clear()
-                            stdscr.addstr(4, 0, "Incorrect!", curses.A_BOLD | curses.A_UNDERLINE)
-                            stdscr.addstr(5, 0, f"Explanation: {questions['explanation']}")
-                            stdscr.addstr(12, 0, "[press any key to continue]")
-                            stdscr.refresh()
-                            stdscr.getch()
-                            playsoundct("enter.mp3")
-                            break
-
-            # After question loop, return to animations
-            stdscr.clear()
-            stdscr.refresh()
+                await blinker.play_async(blink_candy_frames(self.stdscr, ascii_candyDispensing, 2, 0.25), cues)
+                cues = None
+                if result_future.done():
+                    break
+            result = result_future.result()
+            metrics.count("dispenses_total", result="ok" if result.ok else "failed")
+            metrics.observe("dispense_seconds", result.latency)
 
-        except KeyboardInterrupt:
-            break  # Graceful exit on Ctrl+C
+            # Show the real outcome
+            self.stdscr.clear()
+            if result.ok:
+                self.stdscr.addstr(3, 0, "Enjoy your candy!", curses.A_BOLD)
+            else:
+                self.stdscr.addstr(3, 0, f"Sorry, the candy didn't come out ({result.message}).", curses.A_BOLD)
+                self.stdscr.addstr(4, 0, "Please ask a club member for help.")
+            self.stdscr.refresh()
+            await asyncio.sleep(2)
         finally:
-            reset_states()  # Cleanup on exit
+            timeline.cancel(DISPENSING_SOUNDS)
+        self.dispensed = result.ok
+        return FAREWELL
+
+    async def farewell(self):
+        self.stdscr.clear()
+        self.stdscr.refresh()
+        if self.dispensed:
+            playsoundct("thankyou.mp3")
+
+        # Type the farewell out as its chunks arrive
+        typed = 0
+        while True:
+            joke = self.farewell_stream.text
+            if typed < len(joke):
+                typed += 1
+                self.stdscr.addstr(3, 0, joke[:typed])
+                self.stdscr.refresh()
+                await asyncio.sleep(TYPE_DELAY)
+            elif self.farewell_stream.done or self.farewell_task.done():
+                break  # A failed farewell call never finishes the stream
+            else:
+                await asyncio.sleep(POLL_INTERVAL)
+        await asyncio.sleep(2)
+        self.stdscr.addstr(9, 0, "Thank you for using the SUGAR SERVO!", self.cinstructional)
+        self.stdscr.addstr(10, 0, "[press any key to continue]")
+        self.stdscr.refresh()
+        await read_key(self.stdscr, self.input_fd)
+        playsoundct("enter.mp3")
+
+        # After the session, return to animations
+        self.stdscr.clear()
+        self.stdscr.refresh()
+        return ATTRACT
+
+def main(stdscr):
+    with startup.phase("curses_init"):
+        stdscr = Renderer(stdscr)  # Everything draws through the diffing renderer, see renderfn.Renderer
+        curses.curs_set(0)  # Hide the cursor
+        #colours
+        curses.start_color()
+        curses.init_pair(1, curses.COLOR_WHITE, curses.COLOR_BLUE)   # white text on black
+        cinstructional = curses.color_pair(1)
+
+    # Cached layouts follow the terminal size, see framefn.AssetRegistry
+    assets.resize(*stdscr.getmaxyx())
+    stdscr.resize_listeners.append(assets.resize)
+    stdscr.watch_sigwinch()
+
+    # Attract screen straight away, the warmup carries on behind it
+    blit(stdscr, centered_frame(ascii_stemclub, *stdscr.getmaxyx()))
+    stdscr.refresh()
+    startup.mark("first_frame")
+
+    # SERVOW_RECORD=path records every session for replay, see replayfn
+    recorder = None
+    services = KioskServices()
+    if os.getenv("SERVOW_RECORD"):
+        recorder = SessionRecorder(os.getenv("SERVOW_RECORD"))
+        stdscr = recorder.screen(stdscr)
+        services = recorder.services(services)
+    try:
+        asyncio.run(Kiosk(stdscr, cinstructional, services, recorder, sys.stdin.fileno()).run())
+    except KeyboardInterrupt:
+        pass  # Graceful exit on Ctrl+C
+    finally:
+        reset_states()  # Cleanup on exit
+
+startup = Startup()
+
+def warm_audio():
+    import pygame
+
+    with startup.phase("mixer_init"):
+        pygame.mixer.init(buffer=MIXER_BUFFER)
+    startup.submit("speaker_test", speaker_test)
+    with startup.phase("sound_decode"):
+        sound_bank.load()
+    with startup.phase("audio_latency"):
+        timeline.calibrate()  # Sound cues start this much early to line up with frames
+
+def speaker_test():
+    # Check speaker functionality upon boot, with its own decode so it doesn't wait on the whole bank
+    import pygame
+
+    channel = pygame.mixer.Sound(os.path.join(SOUND_DIR, "correct.mp3")).play()
+    while channel is not None and channel.get_busy():
+        time.sleep(0.05)
+
+def finish_startup():
+    try:
+        startup.wait()
+    finally:
+        startup.save(metrics.directory)
+        metrics.flush()
+
+def boot():
+    # Kept out of import so the art and states can be loaded headless (see benchmark.py)
+    startup.mark("imports")
+    startup.submit("client", get_client)  # Imports and configures the model SDK
+    startup.submit("audio", warm_audio)
+    startup.submit("farewells", farewell_pool.refill)
+    threading.Thread(target=finish_startup, name="startup-report", daemon=True).start()
 
 if __name__ == "__main__":
-    curses.wrapper(main)
\ No newline at end of file
+    # Diagnostics, including those from warmup and refill threads, go to the log, not the screen
+    with open_log(metrics.directory) as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        boot()
+        curses.wrapper(main)
+    print(startup.report())
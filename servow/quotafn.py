@@ -0,0 +1,184 @@
+import datetime
+import json
+import os
+import threading
+import time
+
+from tracefn import metrics
+
+# Per model: requests per minute, tokens per minute, requests per day (None for no daily cap)
+QUOTAS = {
+    "gemini-1.5-flash": (
+        int(os.getenv("SERVOW_RPM", "15")),
+        int(os.getenv("SERVOW_TPM", "1000000")),
+        int(os.getenv("SERVOW_RPD", "1500")),
+    ),
+}
+# Per model: US dollars per million prompt tokens, per million output tokens
+PRICES = {
+    "gemini-1.5-flash": (0.075, 0.30),
+}
+USAGE_FILE = os.getenv("SERVOW_USAGE_FILE", "apiusage.json")
+EXPECTED_OUTPUT_TOKENS = 400  # Reserved per call up front, settled against the real usage afterwards
+BACKGROUND_RESERVE = 0.2  # Share of each bucket background calls leave for interactive ones
+
+INTERACTIVE = 0  # Someone is waiting at the kiosk
+BACKGROUND = 1  # Prefetching, refills
+
+
+class QuotaExceeded(Exception):
+    """
+    Raised when a call can't get quota before its deadline, or the daily cap is used up.
+    """
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, reserve=0.0):
+        """
+        Seconds until amount can be taken while leaving reserve (a share of capacity) behind.
+        """
+        needed = amount + reserve * self.capacity - self.level
+        return max(needed, 0.0) / self.rate
+
+
+class QuotaScheduler:
+    """
+    Paces model calls to each model's requests-per-minute and tokens-per-minute quota, so bursts
+    wait for capacity here instead of failing with 429s.
+    - interactive calls go first: background calls wait while any interactive call is waiting,
+      and leave BACKGROUND_RESERVE of each bucket untouched
+    - tokens are reserved at EXPECTED_OUTPUT_TOKENS per call and settled once real usage is known
+    - a 429 from the API empties the model's buckets, so everything backs off together
+    Models without a quota entry (the canned and http test backends) are never held back.
+    """
+
+    def __init__(self, quotas=None, ledger=None):
+        self.quotas = QUOTAS if quotas is None else quotas
+        self.ledger = ledger
+        self.buckets = {}  # model -> (request bucket, token bucket)
+        self.waiting = [0, 0]  # Waiting calls per priority
+        self.condition = threading.Condition()
+
+    def _buckets(self, model):
+        if model not in self.buckets:
+            rpm, tpm, _ = self.quotas[model]
+            self.buckets[model] = (TokenBucket(rpm), TokenBucket(tpm))
+        return self.buckets[model]
+
+    def acquire(self, model, tokens, priority=INTERACTIVE, deadline=None):
+        """
+        Block until the call fits the quota, then take its share. deadline is a time.monotonic() value.
+        """
+        if model not in self.quotas:
+            return
+        daily = self.quotas[model][2]
+        if daily is not None and self.ledger is not None and self.ledger.requests_today(model) >= daily:
+            raise QuotaExceeded(f"Daily request cap of {daily} for {model} reached")
+
+        reserve = BACKGROUND_RESERVE if priority == BACKGROUND else 0.0
+        start = time.monotonic()
+        with self.condition:
+            self.waiting[priority] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    requests, token_bucket = self._buckets(model)
+                    requests.refill(now)
+                    token_bucket.refill(now)
+                    wait = max(requests.wait_time(1, reserve), token_bucket.wait_time(tokens, reserve))
+                    if priority == BACKGROUND and self.waiting[INTERACTIVE]:
+                        wait = max(wait, 0.05)  # Let the interactive call through first
+                    if wait <= 0:
+                        requests.level -= 1
+                        token_bucket.level -= tokens
+                        break
+                    if deadline is not None and now + wait > deadline:
+                        metrics.count("quota_rejections_total", model=model, priority=priority)
+                        raise QuotaExceeded(f"No {model} quota within the deadline (next in {wait:.1f}s)")
+                    self.condition.wait(wait)
+            finally:
+                self.waiting[priority] -= 1
+        metrics.observe("quota_wait_seconds", time.monotonic() - start, priority=priority)
+
+    def settle(self, model, reserved, used):
+        """
+        Correct the token bucket once a call's real token count is known.
+        """
+        if model not in self.quotas:
+            return
+        with self.condition:
+            self._buckets(model)[1].level -= used - reserved
+            self.condition.notify_all()
+
+    def throttled(self, model):
+        """
+        The API said 429: treat both buckets as spent so calls wait for a full refill share.
+        """
+        if model not in self.quotas:
+            return
+        with self.condition:
+            for bucket in self._buckets(model):
+                bucket.level = min(bucket.level, 0.0)
+        metrics.count("quota_throttled_total", model=model)
+
+
+class UsageLedger:
+    """
+    Requests, tokens and cost per day and model, saved to USAGE_FILE after every call
+    so the totals survive restarts.
+    """
+
+    def __init__(self, path=USAGE_FILE, prices=None):
+        self.path = path
+        self.prices = PRICES if prices is None else prices
+        self.lock = threading.Lock()
+        self.days = {}
+        try:
+            with open(path, encoding="utf-8") as f:
+                days = json.load(f)
+            if isinstance(days, dict):
+                self.days = days
+        except (OSError, ValueError):
+            pass  # First run, or a damaged file we start over from
+
+    def record(self, model, usage):
+        prompt_price, output_price = self.prices.get(model, (0.0, 0.0))
+        cost = (usage["prompt_tokens"] * prompt_price + usage["output_tokens"] * output_price) / 1e6
+        today = datetime.date.today().isoformat()
+        with self.lock:
+            day = self.days.setdefault(today, {}).setdefault(
+                model, {"requests": 0, "prompt_tokens": 0, "output_tokens": 0, "cost_usd": 0.0}
+            )
+            day["requests"] += 1
+            day["prompt_tokens"] += usage["prompt_tokens"]
+            day["output_tokens"] += usage["output_tokens"]
+            day["cost_usd"] += cost
+            self._save()
+        metrics.count("api_tokens_total", usage["prompt_tokens"], model=model, kind="prompt")
+        metrics.count("api_tokens_total", usage["output_tokens"], model=model, kind="output")
+
+    def requests_today(self, model):
+        with self.lock:
+            return self.days.get(datetime.date.today().isoformat(), {}).get(model, {}).get("requests", 0)
+
+    def today(self):
+        with self.lock:
+            return json.loads(json.dumps(self.days.get(datetime.date.today().isoformat(), {})))
+
+    def _save(self):
+        try:
+            with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(self.days, f, indent=2)
+            os.replace(self.path + ".tmp", self.path)
+        except OSError as e:
+            print(f"Could not save API usage: {e}")
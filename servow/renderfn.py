@@ -0,0 +1,181 @@
+import curses
+import os
+import signal
+
+from tracefn import metrics
+
+BLANK = (" ", curses.A_NORMAL)
+MERGE_GAP = 4  # Unchanged cells worth re-sending to avoid a separate cursor move
+
+
+def put_text(window, y, x, text, attr=curses.A_NORMAL):
+    try:
+        window.addstr(y, x, text, attr)
+    except curses.error:
+        pass  # Writing the bottom-right cell moves the cursor off screen, the text is still drawn
+
+
+class Renderer:
+    """
+    Double-buffered stand-in for stdscr.
+    Drawing calls write to a back buffer, refresh() compares it with what is already
+    on the terminal (the front buffer) and sends only the changed cells.
+    clear() only blanks the back buffer, so it never forces curses to repaint the whole terminal.
+    Anything else (nodelay, keypad, ...) is passed straight through to stdscr.
+    getch() also notices terminal resizes (KEY_RESIZE, or SIGWINCH after watch_sigwinch()),
+    see resize().
+    """
+
+    def __init__(self, stdscr):
+        self.stdscr = stdscr
+        self.frames = 0
+        self.last_frame_bytes = 0
+        self.total_bytes = 0
+        self.resize_listeners = []  # Called with (height, width) after a resize
+        self.sigwinch = False
+        self._allocate()
+
+    def __getattr__(self, name):
+        return getattr(self.stdscr, name)
+
+    def _allocate(self):
+        self.height, self.width = self.stdscr.getmaxyx()
+        self.back = [[BLANK] * self.width for _ in range(self.height)]
+        self.front = [[None] * self.width for _ in range(self.height)]  # Unknown, so the first frame sends everything
+        self.stdscr.clear()
+
+    def getmaxyx(self):
+        return self.height, self.width
+
+    def getch(self):
+        if self.sigwinch:
+            self.sigwinch = False
+            size = os.get_terminal_size()
+            curses.resizeterm(size.lines, size.columns)
+            self.resize()
+        key = self.stdscr.getch()
+        if key == curses.KEY_RESIZE:
+            self.resize()
+        return key
+
+    def watch_sigwinch(self):
+        """
+        Take SIGWINCH over from curses, the resize is then picked up on the next getch().
+        """
+        signal.signal(signal.SIGWINCH, self._on_sigwinch)
+
+    def _on_sigwinch(self, signum, frame):
+        self.sigwinch = True
+
+    def resize(self):
+        """
+        Follow the terminal to its new size: keep what was drawn (clipped to fit), tell the
+        listeners, and repaint everything. Returns False if the size hadn't changed.
+        """
+        if self.stdscr.getmaxyx() == (self.height, self.width):
+            return False
+        back = self.back
+        self._allocate()
+        for y, row in enumerate(back[:self.height]):
+            self.back[y][:len(row[:self.width])] = row[:self.width]
+        for listener in self.resize_listeners:
+            listener(self.height, self.width)
+        self.refresh()
+        return True
+
+    def clear(self):
+        self.back = [[BLANK] * self.width for _ in range(self.height)]
+
+    erase = clear
+
+    def addstr(self, y, x, text, attr=curses.A_NORMAL):
+        """
+        Same wrapping as curses: long text continues on the next line and newlines
+        start a new line at column 0. Text past the screen is clipped instead of raising.
+        """
+        text = str(text)
+        for char in text:
+            if y >= self.height:
+                return
+            if char == "\n":
+                if 0 <= y and 0 <= x < self.width:
+                    self.back[y][x:] = [BLANK] * (self.width - x)  # Newline clears the rest of the line
+                y, x = y + 1, 0
+                continue
+            if x >= self.width:
+                y, x = y + 1, 0
+                if y >= self.height:
+                    return
+            if 0 <= y and 0 <= x:
+                self.back[y][x] = (char, attr)
+            x += 1
+
+    def addch(self, y, x, char, attr=curses.A_NORMAL):
+        if 0 <= y < self.height and 0 <= x < self.width:
+            self.back[y][x] = (chr(char) if isinstance(char, int) else char, attr)
+
+    def refresh(self):
+        """
+        Send the changed cells to the terminal. Returns an estimate of the bytes written.
+        """
+        if self.stdscr.getmaxyx() != (self.height, self.width):
+            self.resize()  # Resized without a getch() noticing, resize() repaints
+            return self.last_frame_bytes
+
+        written = 0
+        for y in range(self.height):
+            back_row, front_row = self.back[y], self.front[y]
+            if back_row == front_row:
+                continue
+            for x, cells in self._changed_runs(back_row, front_row):
+                written += self._emit(y, x, cells)
+            self.front[y] = list(back_row)
+
+        self.stdscr.refresh()
+        self.frames += 1
+        self.last_frame_bytes = written
+        self.total_bytes += written
+        # Bytes per frame is render_bytes_total / render_frames_total; a full repaint would send
+        # about render_cells_total bytes, so the two show what diffing saves
+        metrics.count("render_frames_total")
+        metrics.count("render_bytes_total", written)
+        metrics.count("render_cells_total", self.height * self.width)
+        return written
+
+    def _changed_runs(self, back_row, front_row):
+        """
+        Runs of cells that differ between the buffers, merging runs separated by a small
+        unchanged gap with the same attribute so the cursor doesn't have to jump.
+        """
+        runs = []
+        x = 0
+        while x < self.width:
+            if back_row[x] == front_row[x]:
+                x += 1
+                continue
+            start = x
+            attr = back_row[x][1]
+            end = x + 1
+            gap = 0
+            while end < self.width and back_row[end][1] == attr and gap <= MERGE_GAP:
+                gap = gap + 1 if back_row[end] == front_row[end] else 0
+                end += 1
+            end -= gap  # Don't send trailing unchanged cells
+            runs.append((start, back_row[start:end]))
+            x = end
+        return runs
+
+    def _emit(self, y, x, cells):
+        text = "".join(char for char, _ in cells)
+        attr = cells[0][1]
+        put_text(self.stdscr, y, x, text, attr)
+        # Text plus roughly one cursor-position escape and one attribute escape per run
+        return len(text.encode("utf-8")) + len(f"\x1b[{y + 1};{x + 1}H") + (4 if attr else 0)
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "last_frame_bytes": self.last_frame_bytes,
+            "total_bytes": self.total_bytes,
+            "avg_frame_bytes": self.total_bytes / self.frames if self.frames else 0.0,
+        }
@@ -0,0 +1,351 @@
+"""
+Record kiosk sessions and replay them headlessly under a virtual clock.
+
+Recording: run proton.py with SERVOW_RECORD=sessions.jsonl. Each finished session is appended
+as one JSON line with its keystrokes (seconds from session start) and the results of its
+outside-world calls (questions, farewell text, dispense results) with their latencies.
+
+Replay:
+
+    python replayfn.py sessions.jsonl [--repeat N] [--size 24x80]
+
+drives proton.Kiosk through each session on an in-memory screen. Sleeps and frame waits run
+on a virtual clock that jumps straight to the next timer, so sessions replay as fast as the CPU
+allows. Reports CPU per session, stalls (one loop iteration blocking for longer than
+STALL_SECONDS of real time) and sessions that never got back to the attract screen.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import selectors
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+
+from headlessfn import FakeScreen, use_fake_terminal
+
+STALL_SECONDS = 0.1  # Real time one loop iteration may take before it counts as a stall
+SESSION_TIMEOUT = 600.0  # Virtual seconds before a replayed session counts as stuck
+THREAD_WAIT = 1.0  # Real seconds to wait on worker threads before checking timers again
+
+
+class SessionRecorder:
+    """
+    Captures sessions for replay. Wrap the screen with screen() and the kiosk's services with
+    services(); the kiosk calls start_session()/end_session() around each session.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.session = None
+        self.started = 0.0
+
+    def start_session(self, height, width):
+        with self.lock:
+            self.started = time.monotonic()
+            self.session = {"recorded": time.time(), "terminal": [height, width], "keys": [], "calls": []}
+
+    def end_session(self, outcome):
+        with self.lock:
+            session, self.session = self.session, None
+        if session is None:
+            return
+        session["outcome"] = outcome
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(session) + "\n")
+        except OSError as e:
+            print(f"Could not save session recording: {e}")
+
+    def record_key(self, key):
+        with self.lock:
+            if self.session is not None:
+                self.session["keys"].append([time.monotonic() - self.started, key])
+
+    def record_call(self, kind, result, latency):
+        with self.lock:
+            if self.session is not None:
+                self.session["calls"].append({"kind": kind, "result": result, "latency": latency})
+
+    def screen(self, stdscr):
+        return RecordingScreen(stdscr, self)
+
+    def services(self, services):
+        return RecordingServices(services, self)
+
+
+class RecordingScreen:
+    """
+    Passes everything through to stdscr, noting each key getch() returns.
+    """
+
+    def __init__(self, stdscr, recorder):
+        self.stdscr = stdscr
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self.stdscr, name)
+
+    def getch(self):
+        key = self.stdscr.getch()
+        if key != -1:
+            self.recorder.record_key(key)
+        return key
+
+
+class RecordingServices:
+    """
+    Wraps proton.KioskServices, noting each call's result and latency.
+    """
+
+    def __init__(self, services, recorder):
+        self.services = services
+        self.recorder = recorder
+
+    def warm(self, scale):
+        self.services.warm(scale)
+
+    def reset(self):
+        self.services.reset()
+
+    def question(self, subject, difficulty, scale, on_field=None):
+        start = time.monotonic()
+        question = self.services.question(subject, difficulty, scale, on_field)
+        self.recorder.record_call("question", question, time.monotonic() - start)
+        return question
+
+    def farewell(self, stream):
+        start = time.monotonic()
+        self.services.farewell(stream)
+        self.recorder.record_call("farewell", stream.text, time.monotonic() - start)
+
+    def dispense(self):
+        start = time.monotonic()
+        future = self.services.dispense()
+
+        def done(future):
+            result = future.result()
+            self.recorder.record_call("dispense", {
+                "ok": result.ok, "status": result.status, "attempts": result.attempts,
+                "latency": result.latency, "error": result.error,
+            }, time.monotonic() - start)
+
+        future.add_done_callback(done)
+        return future
+
+
+class ReplayServices:
+    """
+    Answers the kiosk's calls with a recorded session's results, in order and without waiting.
+    """
+
+    def __init__(self, session):
+        self.calls = {}
+        for call in session["calls"]:
+            self.calls.setdefault(call["kind"], []).append(call["result"])
+
+    def _next(self, kind):
+        results = self.calls.get(kind)
+        if not results:
+            raise LookupError(f"recording has no more {kind} results")
+        return results.pop(0)
+
+    def warm(self, scale):
+        pass
+
+    def reset(self):
+        pass
+
+    def question(self, subject, difficulty, scale, on_field=None):
+        question = self._next("question")
+        if question and on_field is not None:
+            on_field(("question",), question["question"])
+            for key, value in question["options"].items():
+                on_field(("options", key), value)
+        return question
+
+    def farewell(self, stream):
+        stream.push(self._next("farewell"))
+        stream.finish()
+
+    def dispense(self):
+        from dispensefn import DispenseResult
+
+        recorded = self._next("dispense")
+        future = Future()
+        future.set_result(DispenseResult(recorded["ok"], recorded["status"], recorded["attempts"],
+                                         recorded["latency"], recorded["error"]))
+        return future
+
+
+class ScriptedScreen(FakeScreen):
+    """
+    FakeScreen whose getch() hands out recorded keys once the clock reaches their time.
+    """
+
+    def __init__(self, height, width, keys, clock):
+        super().__init__(height, width)
+        self.keys = list(keys)
+        self.clock = clock
+
+    def getch(self):
+        if self.keys and self.clock() >= self.keys[0][0]:
+            return self.keys.pop(0)[1]
+        return -1
+
+
+class _VirtualSelector:
+    """
+    Selector for VirtualClockLoop: polls without blocking, and where the loop would sleep until
+    its next timer it moves the virtual clock forward instead. Worker threads still run in
+    real time, so while any are busy it really waits for them.
+    """
+
+    def __init__(self, selector):
+        self.selector = selector
+        self.loop = None
+        self.last_select = None
+
+    def __getattr__(self, name):
+        return getattr(self.selector, name)
+
+    def select(self, timeout=None):
+        loop = self.loop
+        now = time.perf_counter()
+        if self.last_select is not None:
+            loop.busiest = max(loop.busiest, now - self.last_select)
+        events = self.selector.select(0)
+        if not events and timeout != 0:
+            if timeout is None:
+                events = self.selector.select(None)  # No timers, only outside work can wake the loop
+            elif loop.thread_work:
+                events = self.selector.select(min(timeout, THREAD_WAIT))
+            else:
+                loop.virtual += timeout
+        self.last_select = time.perf_counter()
+        return events
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    """
+    Event loop whose time() is virtual, so asyncio.sleep() and timeouts take no real time.
+    busiest is the longest real time one loop iteration spent running callbacks.
+    """
+
+    def __init__(self):
+        selector = _VirtualSelector(selectors.DefaultSelector())
+        super().__init__(selector)
+        selector.loop = self
+        self.virtual = 0.0
+        self.thread_work = 0
+        self.busiest = 0.0
+
+    def time(self):
+        return self.virtual
+
+    def run_in_executor(self, executor, func, *args):
+        future = super().run_in_executor(executor, func, *args)
+        self.thread_work += 1
+        future.add_done_callback(self._thread_done)
+        return future
+
+    def _thread_done(self, future):
+        self.thread_work -= 1
+
+
+@contextlib.contextmanager
+def scratch_metrics():
+    """
+    Point tracefn.metrics at a throwaway directory, so a replay on a kiosk host never adds to
+    its real trace or rewrites its Prometheus textfile.
+    """
+    from tracefn import metrics
+
+    previous = metrics.directory
+    with tempfile.TemporaryDirectory(prefix="servow-replay-") as directory:
+        metrics.set_directory(directory)
+        try:
+            yield
+        finally:
+            metrics.flush()  # Spans still pending go to the scratch directory too
+            metrics.set_directory(previous)
+
+
+def load_sessions(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def replay_session(session, size=None):
+    """
+    Replay one recorded session, returns its measurements.
+    """
+    from proton import Kiosk
+    from renderfn import Renderer
+
+    height, width = size or session["terminal"]
+    use_fake_terminal(height, width)
+    loop = VirtualClockLoop()
+    screen = ScriptedScreen(height, width, session["keys"], loop.time)
+    kiosk = Kiosk(Renderer(screen), 0, services=ReplayServices(session))
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    error = None
+    try:
+        with scratch_metrics():
+            loop.run_until_complete(asyncio.wait_for(kiosk.run(sessions=1), SESSION_TIMEOUT))
+    except Exception as e:
+        error = repr(e)
+    finally:
+        loop.run_until_complete(loop.shutdown_default_executor())
+        loop.close()
+    return {
+        "cpu": time.process_time() - cpu,
+        "wall": time.perf_counter() - wall,
+        "virtual": loop.virtual,
+        "busiest": loop.busiest,
+        "error": error,
+        "outcome": kiosk.last_outcome,
+        "expected": session.get("outcome"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded kiosk sessions under a virtual clock")
+    parser.add_argument("recording")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the whole recording this many times")
+    parser.add_argument("--size", help="HEIGHTxWIDTH terminal size instead of the recorded one")
+    args = parser.parse_args()
+    size = tuple(int(n) for n in args.size.split("x")) if args.size else None
+
+    sessions = load_sessions(args.recording) * args.repeat
+    results = []
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # The kiosk prints diagnostics per session
+        for session in sessions:
+            results.append(replay_session(session, size))
+    elapsed = time.perf_counter() - start
+
+    cpu = sorted(result["cpu"] for result in results)
+    stalls = [result for result in results if result["busiest"] > STALL_SECONDS]
+    failed = [result for result in results if result["error"] or result["outcome"] != result["expected"]]
+    print(f"Replayed {len(results)} sessions in {elapsed:.2f}s ({len(results) / elapsed * 60:.0f} per minute)")
+    if cpu:
+        print(f"CPU per session: mean {statistics.fmean(cpu) * 1000:.1f}ms, p95 {cpu[int(len(cpu) * 0.95)] * 1000:.1f}ms, "
+              f"max {cpu[-1] * 1000:.1f}ms")
+        print(f"Virtual session length: mean {statistics.fmean(result['virtual'] for result in results):.1f}s")
+    print(f"Stalls (> {STALL_SECONDS * 1000:.0f}ms blocking the loop): {len(stalls)}")
+    for result in stalls[:10]:
+        print(f"  {result['busiest'] * 1000:.0f}ms")
+    print(f"Failed or diverged sessions: {len(failed)}")
+    for result in failed[:10]:
+        print(f"  outcome {result['outcome']!r}, recorded {result['expected']!r}, error {result['error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import asyncio
+import curses
+import time
+
+from tracefn import metrics
+from timelinefn import timeline as default_timeline
+
+ENTER_KEYS = (curses.KEY_ENTER, 10, 13)
+POLL_INTERVAL = 0.01  # Seconds between key polls when waiting inside the asyncio loop
+KEY_WAIT = 1.0  # Longest read_key sleeps on the input fd before checking curses again, e.g. for a resize
+
+
+class FrameScheduler:
+    """
+    Plays effects written as frame generators: each step draws a frame into stdscr
+    (without refreshing) and yields how long that frame should stay on screen.
+    - Frames are paced against deadlines on a monotonic clock, so render cost doesn't
+      add up into drift. A frame whose slot has already passed is dropped, not shown late.
+    - Input is checked while waiting out every frame, so a stop key is seen within one frame.
+    - Sounds can be cued to frames, see cues in play(). They go on the timeline one frame ahead,
+      so the timeline has time to compensate for the mixer's latency.
+    - With input_fd (the terminal's stdin), play_async() sleeps until input is ready or the frame
+      is due instead of polling. last_input is when a key last arrived; with wake_on_input set,
+      any key (not just a stop key) ends playback.
+    play_async() reads the event loop's clock, so it follows a virtual clock under replay (see replayfn).
+    Each playback's frames shown and dropped, length and worst frame go to the metrics, see _report().
+    """
+
+    def __init__(self, stdscr, stop_keys=ENTER_KEYS, timeline=None, input_fd=None):
+        self.stdscr = stdscr
+        self.stop_keys = stop_keys
+        self.timeline = timeline or default_timeline
+        self.input_fd = input_fd
+        self.wake_on_input = False
+        self.last_input = 0.0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.shown = 0
+        self.dropped = 0
+        self.worst_frame = 0.0  # Longest gap between two presented frames, in seconds
+        self.play_worst = 0.0  # The same, for the current playback only
+        self.elapsed = 0.0
+        self._last_present = None
+
+    def play(self, frames, cues=None):
+        """
+        Run a frame generator to the end. Returns the stop key if one was pressed, else None.
+        cues maps a frame index to a sound name, or a list of names to chain, heard as that frame appears.
+        """
+        start = time.monotonic()
+        deadline = start
+        shown, dropped, self.play_worst = self.shown, self.dropped, 0.0
+        self._cue(cues, 0, deadline)
+        try:
+            for index, hold in enumerate(frames):
+                deadline = self._present(hold, deadline, time.monotonic)
+                self._cue(cues, index + 1, deadline)
+                key = self._wait_until(deadline)
+                if key is not None:
+                    return key
+            return None
+        finally:
+            self._report(time.monotonic() - start, shown, dropped)
+            if self.stop_keys:
+                self.stdscr.timeout(-1)  # Back to blocking input for the menus
+
+    async def play_async(self, frames, cues=None):
+        """
+        play() for the asyncio kiosk loop, yielding to other tasks while each frame is held.
+        """
+        clock = asyncio.get_running_loop().time
+        start = clock()
+        deadline = start
+        shown, dropped, self.play_worst = self.shown, self.dropped, 0.0
+        self._cue(cues, 0, deadline)
+        try:
+            for index, hold in enumerate(frames):
+                deadline = self._present(hold, deadline, clock)
+                self._cue(cues, index + 1, deadline)
+                key = await self._wait_until_async(deadline, clock)
+                if key is not None:
+                    return key
+            return None
+        finally:
+            self._report(clock() - start, shown, dropped)
+
+    def _report(self, seconds, shown, dropped):
+        # Achieved fps is animation_frames_total{result="shown"} / animation_seconds_total
+        self.elapsed += seconds
+        metrics.count("animation_seconds_total", seconds)
+        metrics.count("animation_frames_total", self.shown - shown, result="shown")
+        metrics.count("animation_frames_total", self.dropped - dropped, result="dropped")
+        metrics.observe("animation_worst_frame_seconds", self.play_worst)
+
+    def _cue(self, cues, index, at):
+        # at is when frame index is due, the timeline works on the same (monotonic) clock
+        if not cues or index not in cues:
+            return
+        names = cues[index]
+        if isinstance(names, str):
+            self.timeline.cue(names, at)
+        else:
+            self.timeline.chain(names, at)
+
+    def _present(self, hold, deadline, clock):
+        """
+        Show the frame the generator just drew, unless its slot has already passed.
+        Returns the deadline for the next frame.
+        """
+        if clock() > deadline + hold:
+            self.dropped += 1  # Already past this frame's slot, catch up instead of drifting
+        else:
+            self.stdscr.refresh()
+            self._presented(clock())
+        return deadline + hold
+
+    def _presented(self, now):
+        if self._last_present is not None:
+            frame_time = now - self._last_present
+            self.worst_frame = max(self.worst_frame, frame_time)
+            self.play_worst = max(self.play_worst, frame_time)
+            metrics.observe("frame_seconds", frame_time)
+        self._last_present = now
+        self.shown += 1
+
+    def _wait_until(self, deadline):
+        """
+        Wait for the deadline, returning early with a stop key if one is pressed.
+        """
+        if not self.stop_keys:
+            time.sleep(max(deadline - time.monotonic(), 0))
+            return None
+        while True:
+            remaining = deadline - time.monotonic()
+            self.stdscr.timeout(max(int(remaining * 1000), 0))
+            key = self.stdscr.getch()
+            if key in self.stop_keys:
+                return key
+            if time.monotonic() >= deadline:
+                return None
+
+    async def _wait_until_async(self, deadline, clock):
+        while True:
+            remaining = deadline - clock()
+            if self.stop_keys:
+                self.stdscr.timeout(0)
+                key = self.stdscr.getch()  # Also drains anything curses already buffered
+                if key not in (-1, curses.KEY_RESIZE):
+                    self.last_input = clock()
+                    if key in self.stop_keys or self.wake_on_input:
+                        return key
+            if remaining <= 0:
+                return None
+            if self.stop_keys and self.input_fd is not None:
+                await wait_readable(self.input_fd, remaining)
+            else:
+                await asyncio.sleep(min(remaining, POLL_INTERVAL))
+
+    def stats(self):
+        return {
+            "fps": self.shown / self.elapsed if self.elapsed else 0.0,
+            "frames_shown": self.shown,
+            "frames_dropped": self.dropped,
+            "worst_frame_ms": self.worst_frame * 1000,
+        }
+
+
+def run_frames(stdscr, frames):
+    """
+    Play a frame generator to completion without watching for input.
+    """
+    FrameScheduler(stdscr, stop_keys=()).play(frames)
+
+
+async def wait_readable(fd, timeout):
+    """
+    Sleep until fd has input or timeout passes, without waking up to poll in between.
+    """
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+    try:
+        await asyncio.wait_for(ready, timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        loop.remove_reader(fd)
+
+
+async def read_key(stdscr, input_fd=None):
+    """
+    Wait for a key press without blocking the asyncio loop.
+    With input_fd (the terminal's stdin) it sleeps until input arrives instead of polling,
+    so a screen left waiting on a key costs next to no CPU.
+    Resizes aren't key presses, the Renderer has already handled them.
+    """
+    stdscr.timeout(0)
+    while True:
+        key = stdscr.getch()
+        if key not in (-1, curses.KEY_RESIZE):
+            return key
+        if input_fd is not None:
+            await wait_readable(input_fd, KEY_WAIT)
+        else:
+            await asyncio.sleep(POLL_INTERVAL)
@@ -0,0 +1,202 @@
+"""
+Shared question service, so several kiosks at one venue use one model client and one question pool.
+
+    python servicefn.py [address]
+
+address is "unix:/path/to.sock" or "host:port" (default SERVOW_QUESTION_SERVICE, else
+unix:/tmp/servow-questions.sock). Kiosks point SERVOW_QUESTION_SERVICE at the same address;
+see operationfn.get_questions_from_api, which calls the service directly when it is down.
+
+Protocol: one JSON object per line each way.
+    {"op": "question", "subject": ..., "difficulty": ..., "scale": ...} -> {"ok": true, "question": {...} or null}
+    {"op": "stats"} -> {"ok": true, "stats": {...}}
+"""
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from clientfn import DEFAULT_DEADLINE
+
+DEFAULT_ADDRESS = os.getenv("SERVOW_QUESTION_SERVICE", "unix:/tmp/servow-questions.sock")
+REQUEST_MARGIN = 2.0  # Seconds a kiosk allows on top of the slowest the service can take to answer
+REQUEST_TIMEOUT = DEFAULT_DEADLINE + REQUEST_MARGIN  # Kiosks pass their own, see operationfn.question_service
+RETRY_AFTER = 30.0  # Seconds a kiosk calls directly after failing to reach the service
+WORKERS = 16  # Threads the service runs blocking fetches on
+
+
+def parse_address(address):
+    """
+    ("unix", path) or ("tcp", (host, port)).
+    """
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    return "tcp", (host or "127.0.0.1", int(port))
+
+
+class QuestionServer:
+    """
+    Serves questions from supply(subject, difficulty, scale) to many kiosks over asyncio.
+    Every request gets its own supply call, so concurrent kiosks each take their own question;
+    supply (QuestionPool.get) is where concurrent misses share one live fetch.
+    """
+
+    def __init__(self, supply, workers=WORKERS, pool_stats=None):
+        self.supply = supply
+        self.pool_stats = pool_stats  # e.g. QuestionPool.stats, included in the stats op
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="question-service")
+        self.requests = 0
+        self.active = 0
+        self.failures = 0
+        self.connections = 0
+
+    async def serve(self, address):
+        kind, target = parse_address(address)
+        if kind == "unix":
+            if os.path.exists(target):
+                os.unlink(target)  # Stale socket from a previous run
+            server = await asyncio.start_unix_server(self._handle, path=target)
+        else:
+            server = await asyncio.start_server(self._handle, *target)
+        print(f"Question service listening on {address}")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = await self._dispatch(json.loads(line))
+                except Exception as e:
+                    reply = {"ok": False, "error": repr(e)}
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass  # Kiosk went away mid-request
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _dispatch(self, request):
+        op = request.get("op")
+        if op == "question":
+            question = await self.question(request["subject"], int(request["difficulty"]), int(request["scale"]))
+            return {"ok": True, "question": question}
+        if op == "stats":
+            return {"ok": True, "stats": self.stats()}
+        return {"ok": False, "error": f"unknown op {op!r}"}
+
+    async def question(self, subject, difficulty, scale):
+        self.requests += 1
+        self.active += 1
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, self.supply, subject, difficulty, scale)
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            self.active -= 1
+
+    def stats(self):
+        stats = {
+            "requests": self.requests,
+            "failures": self.failures,
+            "connections": self.connections,
+            "active": self.active,
+        }
+        if self.pool_stats is not None:
+            stats["pool"] = self.pool_stats()
+        return stats
+
+
+class ServiceUnavailable(Exception):
+    pass
+
+
+class QuestionServiceClient:
+    """
+    Blocking client a kiosk uses from its fetch thread. One connection per request keeps it
+    simple and safe across threads. When the service can't be reached it is skipped for
+    RETRY_AFTER seconds, so a kiosk with no service running doesn't pay a connect attempt on
+    every question. A slow or failed answer doesn't count as down, a busy service is still up.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=REQUEST_TIMEOUT, retry_after=RETRY_AFTER):
+        self.address = address
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.down_until = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.address != "off"
+
+    def available(self):
+        with self.lock:
+            return self.enabled and time.monotonic() >= self.down_until
+
+    def request(self, payload):
+        if not self.available():
+            raise ServiceUnavailable(f"question service {self.address} unavailable")
+        try:
+            kind, target = parse_address(self.address)
+            if kind == "unix":
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.settimeout(self.timeout)
+                sock.connect(target)
+            else:
+                sock = socket.create_connection(target, timeout=self.timeout)
+        except OSError as e:
+            with self.lock:
+                self.down_until = time.monotonic() + self.retry_after
+            raise ServiceUnavailable(f"question service {self.address}: {e}") from e
+        try:
+            with sock, sock.makefile("rwb") as stream:
+                stream.write(json.dumps(payload).encode() + b"\n")
+                stream.flush()
+                line = stream.readline()
+            if not line:
+                raise ConnectionError("service closed the connection")
+            reply = json.loads(line)
+        except (OSError, ValueError) as e:
+            raise ServiceUnavailable(f"question service {self.address}: {e}") from e
+        if not reply.get("ok"):
+            raise ServiceUnavailable(reply.get("error", "service error"))
+        return reply
+
+    def question(self, subject, difficulty, scale):
+        return self.request({"op": "question", "subject": subject, "difficulty": difficulty, "scale": scale})["question"]
+
+    def stats(self):
+        return self.request({"op": "stats"})["stats"]
+
+
+def main():
+    from operationfn import question_pool, use_live_workers
+
+    address = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_ADDRESS
+    use_live_workers(WORKERS)  # Every kiosk's pool miss becomes a live fetch here, not just one kiosk's
+    server = QuestionServer(lambda subject, difficulty, scale: question_pool.get(subject, difficulty, scale),
+                            pool_stats=question_pool.stats)
+    question_pool.warm(int(os.getenv("SERVOW_SCALE", "8")))
+    try:
+        asyncio.run(server.serve(address))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        question_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+SOUND_DIR = "servoSounds"  # Directory where sound files are located
+PCM_CACHE_DIR = "servoSounds/.pcmcache"  # Decoded PCM is kept here so later boots skip MP3 decoding
+MIXER_BUFFER = 512  # Samples per mixer buffer, pass to pygame.mixer.init(buffer=...)
+SHARED_CHANNELS = 8  # Mixer channels for non-exclusive sounds
+
+# Who wins when every shared channel is busy, see SoundBank.play
+PRIORITY_AMBIENT = 0
+PRIORITY_CUE = 1
+PRIORITY_UI = 2
+
+
+class SoundBank:
+    """
+    Decodes every sound in servoSounds/ once and hands out the cached pygame Sound objects.
+    - exclusive sounds get a reserved mixer channel each, so a rapid repeat (e.g. the scroll
+      click) cuts off the previous one instead of piling up on free channels.
+    - other sounds share SHARED_CHANNELS channels. When all are busy, a sound steals the
+      channel of the lowest-priority sound playing, or is dropped if nothing playing is lower.
+    - with pcm_cache on, decoded samples are written to cache_dir keyed by mixer format.
+    Call load() after pygame.mixer.init(), play() stays silent until it has run.
+    pygame is imported on first use, so importing this module doesn't slow down boot.
+    """
+
+    def __init__(self, sound_dir=SOUND_DIR, exclusive=("scroll.mp3", "enter.mp3"), pcm_cache=True, cache_dir=PCM_CACHE_DIR):
+        self.sound_dir = sound_dir
+        self.exclusive = list(exclusive)
+        self.pcm_cache = pcm_cache
+        self.cache_dir = cache_dir
+        self.sounds = {}
+        self.channels = {}
+        self.shared = []  # [channel, priority of what it is playing]
+        self.steals = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+
+    def load(self, parallel=True):
+        """
+        Decode every sound in the directory. Returns the time it took in seconds.
+        """
+        start = time.perf_counter()
+        names = sorted(f for f in os.listdir(self.sound_dir) if f.lower().endswith((".mp3", ".wav", ".ogg")))
+        if parallel:
+            with ThreadPoolExecutor(max_workers=4, thread_name_prefix="sound-load") as executor:
+                loaded = list(executor.map(self._decode, names))
+        else:
+            loaded = [self._decode(name) for name in names]
+        with self.lock:
+            self.sounds.update(zip(names, loaded))
+        self._reserve_channels()
+        self.ready.set()
+        return time.perf_counter() - start
+
+    def get(self, name):
+        """
+        Cached Sound for a file name, decoding it on first use if load() missed it.
+        """
+        sound = self.sounds.get(name)
+        if sound is None:
+            sound = self._decode(name)
+            with self.lock:
+                self.sounds[name] = sound
+        return sound
+
+    def play(self, name, priority=PRIORITY_CUE):
+        """
+        Start a sound now. Returns False if it was dropped for higher-priority sounds.
+        """
+        if not self.ready.is_set():
+            return False  # Still warming up at boot
+        sound = self.get(name)
+        channel = self.channels.get(name)
+        if channel is not None:
+            channel.play(sound)  # Replaces whatever this channel was playing
+            return True
+        with self.lock:
+            slot = self._shared_slot(priority)
+            if slot is None:
+                self.dropped += 1
+                return False
+            slot[0].play(sound)
+            slot[1] = priority
+        return True
+
+    def stop(self, name):
+        """
+        Cut off name wherever it is playing.
+        """
+        sound = self.sounds.get(name) if self.ready.is_set() else None
+        if sound is not None:
+            sound.stop()
+
+    def _shared_slot(self, priority):
+        idle = [slot for slot in self.shared if not slot[0].get_busy()]
+        if idle:
+            return idle[0]
+        victim = min(self.shared, key=lambda slot: slot[1], default=None)
+        if victim is None or victim[1] >= priority:
+            return None
+        self.steals += 1
+        return victim  # play() on it cuts off the lower-priority sound
+
+    def _reserve_channels(self):
+        import pygame
+
+        count = len(self.exclusive)
+        pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), count + SHARED_CHANNELS))
+        pygame.mixer.set_reserved(count)
+        self.channels = {name: pygame.mixer.Channel(i) for i, name in enumerate(self.exclusive)}
+        self.shared = [[pygame.mixer.Channel(i), PRIORITY_AMBIENT] for i in range(count, count + SHARED_CHANNELS)]
+
+    def length(self, name):
+        return self.get(name).get_length()
+
+    def _decode(self, name):
+        import pygame
+
+        path = os.path.join(self.sound_dir, name)
+        if not self.pcm_cache:
+            return pygame.mixer.Sound(path)
+
+        # Cached PCM is only valid for the same source file and the same mixer format
+        frequency, size, channels = pygame.mixer.get_init()
+        stat = os.stat(path)
+        cache_name = f"{name}.{int(stat.st_mtime)}.{stat.st_size}.{frequency}_{size}_{channels}.pcm"
+        cache_path = os.path.join(self.cache_dir, cache_name)
+        if os.path.exists(cache_path):
+            with open(cache_path, "rb") as f:
+                return pygame.mixer.Sound(buffer=f.read())
+
+        sound = pygame.mixer.Sound(path)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(cache_path + ".tmp", "wb") as f:
+                f.write(sound.get_raw())
+            os.replace(cache_path + ".tmp", cache_path)
+        except OSError as e:
+            print(f"Could not cache decoded {name}: {e}")
+        return sound
+
+
+def measure_play_latency(bank, name="scroll.mp3", runs=50):
+    """
+    Time from "key pressed" to Sound.play() returning, loading from disk per call
+    (the old playsoundct) versus using the bank. Returns mean milliseconds for each.
+    """
+    import pygame
+
+    path = os.path.join(bank.sound_dir, name)
+    start = time.perf_counter()
+    for _ in range(runs):
+        pygame.mixer.Sound(path).play()
+    per_call = (time.perf_counter() - start) / runs * 1000
+
+    bank.get(name)
+    start = time.perf_counter()
+    for _ in range(runs):
+        bank.play(name)
+    cached = (time.perf_counter() - start) / runs * 1000
+    pygame.mixer.stop()
+    return {"per_call_load_ms": per_call, "sound_bank_ms": cached}
+
+
+def measure_output_latency(runs=20):
+    """
+    Estimated seconds from Sound.play() to the speaker: one mixer buffer's worth of samples
+    plus the measured cost of starting a (silent) sound. Call after pygame.mixer.init().
+    """
+    import pygame
+
+    frequency, size, channels = pygame.mixer.get_init()
+    silence = pygame.mixer.Sound(buffer=bytes(abs(size) // 8 * channels * MIXER_BUFFER))
+    start = time.perf_counter()
+    for _ in range(runs):
+        silence.play()
+    start_cost = (time.perf_counter() - start) / runs
+    silence.stop()
+    return MIXER_BUFFER / frequency + start_cost
+
+
+sound_bank = SoundBank()
@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from tracefn import metrics
+
+BOOT_START = time.perf_counter()  # Import this module first so the imports phase is counted
+
+
+class Startup:
+    """
+    Times each boot phase and runs the slow ones (client setup, sound decoding, speaker test)
+    on background threads, so the attract screen can be drawn before any of them finish.
+    Phases are recorded as "startup" spans in the metrics, report() gives the breakdown.
+    """
+
+    def __init__(self, start=BOOT_START):
+        self.start = start
+        self.phases = []  # (name, offset from boot, seconds), in completion order
+        self.errors = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="warmup")
+        self.futures = []
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            with metrics.span("startup", phase=name):
+                yield
+        finally:
+            self._record(name, started, time.perf_counter() - started)
+
+    def mark(self, name):
+        """
+        Record a milestone, e.g. the first frame, as a phase running from boot until now.
+        """
+        self._record(name, self.start, time.perf_counter() - self.start)
+
+    def _record(self, name, started, seconds):
+        with self.lock:
+            self.phases.append((name, started - self.start, seconds))
+
+    def submit(self, name, fn, *args):
+        """
+        Run fn as a phase on a warmup thread. A failure is kept for the report instead of raised,
+        a kiosk without sound or a model still boots.
+        """
+        def run():
+            try:
+                with self.phase(name):
+                    fn(*args)
+            except Exception as e:
+                with self.lock:
+                    self.errors[name] = repr(e)
+
+        future = self.executor.submit(run)
+        self.futures.append(future)
+        return future
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        i = 0
+        while i < len(self.futures):  # Phases may submit further phases, e.g. audio -> speaker_test
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            self.futures[i].result(remaining)
+            i += 1
+
+    def report(self):
+        with self.lock:
+            phases = sorted(self.phases, key=lambda phase: phase[1] + phase[2])
+            errors = dict(self.errors)
+        lines = ["Startup phases (ms from boot: start -> end, duration):"]
+        for name, offset, seconds in phases:
+            status = f"  FAILED {errors[name]}" if name in errors else ""
+            lines.append(f"  {name:14} {offset * 1000:8.1f} -> {(offset + seconds) * 1000:8.1f}  {seconds * 1000:8.1f}{status}")
+        return "\n".join(lines)
+
+    def save(self, directory, name="startup.txt"):
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+                f.write(self.report() + "\n")
+        except OSError as e:
+            print(f"Could not write startup report: {e}")
@@ -0,0 +1,137 @@
+import json
+import threading
+
+
+class TextStream:
+    """
+    Text pushed in chunks from a worker thread (e.g. a streamed Gemini response)
+    and read from the UI as it arrives.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.lock = threading.Lock()
+
+    def push(self, chunk):
+        with self.lock:
+            self.chunks.append(chunk)
+
+    def finish(self):
+        self.done = True
+
+    @property
+    def text(self):
+        with self.lock:
+            return "".join(self.chunks)
+
+
+class IncrementalJSONParser:
+    """
+    Parses a JSON object fed in chunks and hands back each field as soon as its value is complete,
+    so e.g. the question text can be shown while the options are still streaming.
+    - feed(chunk) returns a list of (path, value), path being the tuple of keys, e.g. ("options", "A").
+    - Anything before the first "{" (stray text or a ```json fence) is skipped.
+    - Handles nested objects with string/number/bool/null values, which is all the question format uses.
+      On anything else (e.g. an array, or malformed JSON) it stops emitting fields and failed is set;
+      the caller still has the chunks for a full parse.
+    """
+
+    def __init__(self):
+        self.state = "start"
+        self.path = []  # Keys of the objects we are inside, the outermost object has no key
+        self.key = None
+        self.token = []
+        self.escaped = False
+        self.result = {}
+
+    @property
+    def done(self):
+        return self.state == "done"
+
+    @property
+    def failed(self):
+        return self.state == "failed"
+
+    def feed(self, chunk):
+        fields = []
+        if self.failed:
+            return fields
+        try:
+            for char in chunk:
+                self._step(char, fields)
+        except ValueError:
+            self.state = "failed"
+        return fields
+
+    def _step(self, char, fields):
+        state = self.state
+        if state in ("key", "string"):
+            if self.escaped:
+                self.escaped = False
+            elif char == "\\":
+                self.escaped = True
+            elif char == '"':
+                raw = json.loads('"' + "".join(self.token) + '"', strict=False)
+                self.token = []
+                if state == "key":
+                    self.key = raw
+                    self.state = "colon"
+                else:
+                    self._emit(raw, fields)
+                return
+            self.token.append(char)
+        elif state == "start":
+            if char == "{":
+                self.state = "key_or_end"
+        elif state == "key_or_end":
+            if char == '"':
+                self.state = "key"
+            elif char == "}":
+                self._close()
+        elif state == "colon":
+            if char == ":":
+                self.state = "value"
+        elif state == "value":
+            if char == '"':
+                self.state = "string"
+            elif char == "{":
+                self.path.append(self.key)
+                self.state = "key_or_end"
+            elif char == "[":
+                raise ValueError("arrays are not supported")
+            elif not char.isspace():
+                self.token = [char]
+                self.state = "scalar"
+        elif state == "scalar":
+            if char in ",}" or char.isspace():
+                raw = "".join(self.token)
+                self.token = []
+                self._emit(json.loads(raw), fields)
+                if char == "}":
+                    self._close()
+                elif char == ",":
+                    self.state = "key_or_end"
+            else:
+                self.token.append(char)
+        elif state == "after_value":
+            if char == ",":
+                self.state = "key_or_end"
+            elif char == "}":
+                self._close()
+
+    def _emit(self, value, fields):
+        path = tuple(self.path) + (self.key,)
+        target = self.result
+        for key in self.path:
+            target = target.setdefault(key, {})
+        target[self.key] = value
+        fields.append((path, value))
+        self.state = "after_value"
+
+    def _close(self):
+        if self.path:
+            self.path.pop()
+            self.state = "after_value"
+        else:
+            self.state = "done"
@@ -0,0 +1,121 @@
+import os
+import threading
+import tty
+
+import pytest
+
+from dispensefn import (CMD_ACK, CMD_DISPENSE, CMD_NAK, STATUS_EMPTY, STATUS_OK, DispenseTransport,
+                        FakeDispenser, FrameReader, encode_frame)
+
+
+class ScriptedDispenser:
+    """
+    Pty peer that answers each dispense frame with the next scripted reply: "ack", "nak" or "drop".
+    """
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.frames = []
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.master)
+        self.port = os.ttyname(self.slave)
+        self.reader = FrameReader()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                data = os.read(self.master, 256)
+            except OSError:
+                return
+            for seq, cmd, payload in self.reader.feed(data):
+                self.frames.append((seq, cmd, payload))
+                reply = self.replies.pop(0) if self.replies else "ack"
+                if reply == "ack":
+                    os.write(self.master, encode_frame(seq, CMD_ACK, bytes([STATUS_OK])))
+                elif reply == "nak":
+                    os.write(self.master, encode_frame(seq, CMD_NAK))
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+
+@pytest.fixture
+def link():
+    def make(peer, **kwargs):
+        made.append(peer)
+        made.append(DispenseTransport(peer.port, **kwargs))
+        return made[-1]
+
+    made = []
+    yield make
+    for item in reversed(made):
+        item.close()
+
+
+def test_reader_returns_frames_split_across_reads():
+    frame = encode_frame(7, CMD_DISPENSE, b"\x01")
+    reader = FrameReader()
+    assert reader.feed(frame[:3]) == []
+    assert reader.feed(frame[3:]) == [(7, CMD_DISPENSE, b"\x01")]
+
+
+def test_reader_skips_noise_between_frames():
+    reader = FrameReader()
+    data = b"\xff\x00" + encode_frame(1, CMD_ACK, b"\x00") + b"junk" + encode_frame(2, CMD_ACK, b"\x00")
+    assert reader.feed(data) == [(1, CMD_ACK, b"\x00"), (2, CMD_ACK, b"\x00")]
+
+
+def test_reader_drops_frame_with_bad_checksum():
+    bad = bytearray(encode_frame(3, CMD_ACK, b"\x00"))
+    bad[-2] ^= 0xFF
+    reader = FrameReader()
+    assert reader.feed(bytes(bad) + encode_frame(4, CMD_ACK, b"\x00")) == [(4, CMD_ACK, b"\x00")]
+
+
+def test_dispense_acknowledged_first_time(link):
+    transport = link(ScriptedDispenser(["ack"]), ack_timeout=0.5)
+    result = transport.submit(2).result(timeout=2)
+    assert result.ok and result.attempts == 1
+    assert transport.stats()["dispensed"] == 1
+
+
+def test_nak_is_resent_with_same_seq(link):
+    peer = ScriptedDispenser(["nak", "ack"])
+    transport = link(peer, ack_timeout=0.5)
+    result = transport.submit().result(timeout=3)
+    assert result.ok and result.attempts == 2
+    assert peer.frames[0] == peer.frames[1]
+
+
+def test_dropped_reply_is_resent(link):
+    peer = ScriptedDispenser(["drop", "drop", "ack"])
+    transport = link(peer, ack_timeout=0.1)
+    result = transport.submit().result(timeout=3)
+    assert result.ok and result.attempts == 3
+
+
+def test_gives_up_without_acknowledgement(link):
+    peer = ScriptedDispenser(["drop"] * 10)
+    transport = link(peer, ack_timeout=0.05, retries=2)
+    result = transport.submit().result(timeout=3)
+    assert not result.ok and result.attempts == 3
+    assert result.message == "no acknowledgement from dispenser"
+    assert len(peer.frames) == 3
+
+
+def test_resend_during_slow_dispense_drops_candy_once(link):
+    # The ACK comes after the candy drops, so a short ack_timeout resends while the fake is still dispensing
+    fake = FakeDispenser(dispense_time=0.3)
+    transport = link(fake, ack_timeout=0.2)
+    result = transport.submit().result(timeout=3)
+    assert result.ok and result.attempts == 2
+    assert len(fake.received) == 1
+
+
+def test_empty_status_fails_dispense(link):
+    transport = link(FakeDispenser(dispense_time=0, status=STATUS_EMPTY), ack_timeout=0.5)
+    result = transport.submit().result(timeout=2)
+    assert not result.ok and result.message == "dispenser empty"
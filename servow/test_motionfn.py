@@ -0,0 +1,50 @@
+import pytest
+
+from motionfn import MotionEngine, ServoLimits, SimulatedServoBackend, build_trajectory
+
+
+@pytest.fixture
+def engine():
+    def make(limits=None):
+        made.append(MotionEngine(SimulatedServoBackend(), limits))
+        return made[-1]
+
+    made = []
+    yield make
+    for engine in made:
+        engine.close()
+
+
+def test_trajectory_ends_on_target_within_speed_limit():
+    limits = ServoLimits(max_speed=30)
+    angles = build_trajectory(0.0, 90.0, 0.5, limits=limits)
+    assert angles[-1] == 90.0
+    steps = [abs(b - a) * 50 for a, b in zip([0.0] + angles, angles)]
+    assert max(steps) <= 30 + 1e-9
+
+
+def test_trajectory_takes_step_count():
+    assert len(build_trajectory(0.0, 10.0, None, steps=7)) == 7
+
+
+def test_servos_in_one_move_get_equal_length_trajectories(engine):
+    # 4 and 0.1 degrees under a 30 deg/s limit used to come out 8 and 7 ticks long
+    motion = engine({1: ServoLimits(max_speed=30), 2: ServoLimits(max_speed=30)})
+    for small in (0.1, 0.5, 1.0, 2.0):
+        for large in range(1, 30):
+            motion.positions = {1: 0.0, 2: 0.0}
+            move = motion.move_to_positions({1: float(large), 2: small}, 0.01)
+            lengths = {len(angles) for angles in move.trajectories.values()}
+            assert len(lengths) == 1, (large, small, lengths)
+            motion.emergency_stop()
+            motion.reset()
+
+
+def test_servos_arrive_together(engine):
+    motion = engine({1: ServoLimits(max_speed=30)})
+    backend = motion.backend
+    motion.positions = {1: 0.0, 2: 0.0}
+    assert motion.move_to_positions({1: 4.0, 2: 0.1}, 0.05).wait(timeout=2)
+    arrivals = {servo_id: t for t, servo_id, angle in backend.timeline if servo_id is not None}
+    assert backend.angles == {1: 4.0, 2: 0.1}
+    assert abs(arrivals[1] - arrivals[2]) < 1 / 50
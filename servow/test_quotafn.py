@@ -0,0 +1,130 @@
+import datetime
+import json
+import time
+
+import pytest
+
+import quotafn
+from quotafn import BACKGROUND, QuotaExceeded, QuotaScheduler, TokenBucket, UsageLedger
+
+USAGE = {"prompt_tokens": 1000, "output_tokens": 200}
+
+
+@pytest.fixture
+def today(monkeypatch):
+    """
+    Pins datetime.date.today() for the ledger; set .value to move to another day.
+    """
+
+    class Clock:
+        value = datetime.date(2026, 3, 1)
+
+    class FakeDate(datetime.date):
+        @classmethod
+        def today(cls):
+            return Clock.value
+
+    monkeypatch.setattr(quotafn.datetime, "date", FakeDate)
+    return Clock
+
+
+def test_bucket_refills_at_per_minute_rate():
+    bucket = TokenBucket(60)
+    bucket.level = 0.0
+    bucket.refill(bucket.updated + 30)
+    assert bucket.level == pytest.approx(30)
+
+
+def test_bucket_refill_stops_at_capacity():
+    bucket = TokenBucket(60)
+    bucket.refill(bucket.updated + 3600)
+    assert bucket.level == 60
+
+
+def test_bucket_wait_time_covers_shortfall_and_reserve():
+    bucket = TokenBucket(60)
+    bucket.level = 0.0
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    assert bucket.wait_time(1, reserve=0.5) == pytest.approx(31.0)
+
+
+def test_requests_past_the_minute_quota_wait_for_refill():
+    quota = QuotaScheduler({"m": (600, 10**6, None)})
+    for _ in range(600):
+        quota.acquire("m", 1)
+    with pytest.raises(QuotaExceeded):
+        quota.acquire("m", 1, deadline=time.monotonic() + 0.01)
+    start = time.monotonic()
+    quota.acquire("m", 1, deadline=time.monotonic() + 1)
+    assert 0.05 < time.monotonic() - start < 0.5
+
+
+def test_background_leaves_reserve_for_interactive():
+    quota = QuotaScheduler({"m": (10, 10**6, None)})
+    for _ in range(8):
+        quota.acquire("m", 1, BACKGROUND)
+    with pytest.raises(QuotaExceeded):
+        quota.acquire("m", 1, BACKGROUND, deadline=time.monotonic() + 0.01)
+    quota.acquire("m", 1, deadline=time.monotonic() + 0.01)
+
+
+def test_unknown_model_is_never_held_back():
+    QuotaScheduler({}).acquire("canned", 10**9, deadline=time.monotonic())
+
+
+def test_daily_cap_resets_next_day(tmp_path, today):
+    ledger = UsageLedger(str(tmp_path / "usage.json"))
+    quota = QuotaScheduler({"m": (100, 10**6, 2)}, ledger)
+    ledger.record("m", USAGE)
+    ledger.record("m", USAGE)
+    with pytest.raises(QuotaExceeded):
+        quota.acquire("m", 1)
+    today.value += datetime.timedelta(days=1)
+    assert ledger.requests_today("m") == 0
+    quota.acquire("m", 1)
+
+
+def test_ledger_totals_and_cost(tmp_path, today):
+    ledger = UsageLedger(str(tmp_path / "usage.json"), prices={"m": (1.0, 10.0)})
+    ledger.record("m", USAGE)
+    ledger.record("m", USAGE)
+    day = ledger.today()["m"]
+    assert day["requests"] == 2
+    assert day["prompt_tokens"] == 2000 and day["output_tokens"] == 400
+    assert day["cost_usd"] == pytest.approx(0.006)
+
+
+def test_ledger_survives_restart(tmp_path, today):
+    path = str(tmp_path / "usage.json")
+    UsageLedger(path).record("m", USAGE)
+    ledger = UsageLedger(path)
+    assert ledger.requests_today("m") == 1
+    ledger.record("m", USAGE)
+    assert UsageLedger(path).requests_today("m") == 2
+    assert not (tmp_path / "usage.json.tmp").exists()
+
+
+def test_ledger_keeps_previous_days(tmp_path, today):
+    path = str(tmp_path / "usage.json")
+    UsageLedger(path).record("m", USAGE)
+    today.value += datetime.timedelta(days=1)
+    UsageLedger(path).record("m", USAGE)
+    with open(path, encoding="utf-8") as f:
+        assert sorted(json.load(f)) == ["2026-03-01", "2026-03-02"]
+
+
+def test_missing_ledger_starts_empty(tmp_path, today):
+    ledger = UsageLedger(str(tmp_path / "none" / "usage.json"))
+    assert ledger.requests_today("m") == 0
+    ledger.record("m", USAGE)  # Can't save into a missing directory, but still counts
+    assert ledger.requests_today("m") == 1
+
+
+@pytest.mark.parametrize("content", ['{"2026-03-01": {"m": {"requ', "", "[]", "not json"])
+def test_damaged_ledger_starts_over(tmp_path, today, content):
+    path = tmp_path / "usage.json"
+    path.write_text(content, encoding="utf-8")
+    ledger = UsageLedger(str(path))
+    assert ledger.requests_today("m") == 0
+    ledger.record("m", USAGE)
+    assert UsageLedger(str(path)).requests_today("m") == 1
@@ -0,0 +1,76 @@
+import json
+
+from streamfn import IncrementalJSONParser
+
+QUESTION = {
+    "question": 'Which "sugar" do cavity bacteria not ferment?',
+    "options": {"A": "Sucrose", "B": "Xylitol", "C": "Glucose", "D": "Fructose"},
+    "correct_answer": "B",
+    "difficulty": 3,
+    "explained": True,
+    "hint": None,
+}
+
+
+def feed_all(parser, chunks):
+    fields = []
+    for chunk in chunks:
+        fields.extend(parser.feed(chunk))
+    return fields
+
+
+def test_fields_emitted_as_each_value_completes():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"question": "What is 2') == []
+    assert parser.feed('+2?", "options": {"A": "4"') == [(("question",), "What is 2+2?"), (("options", "A"), "4")]
+    assert parser.feed(', "B": "5"}, "correct_answer": "A"}') == [(("options", "B"), "5"), (("correct_answer",), "A")]
+    assert parser.done
+
+
+def test_one_character_chunks_match_full_parse():
+    text = json.dumps(QUESTION)
+    parser = IncrementalJSONParser()
+    fields = feed_all(parser, text)
+    assert parser.done and not parser.failed
+    assert parser.result == QUESTION
+    assert fields[0] == (("question",), QUESTION["question"])
+    assert (("options", "D"), "Fructose") in fields
+
+
+def test_escaped_quote_split_across_chunks():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"question": "Say \\') == []
+    assert parser.feed('"hi\\"') == []
+    assert parser.feed('"}') == [(("question",), 'Say "hi"')]
+    assert parser.done
+
+
+def test_escaped_backslash_before_closing_quote():
+    parser = IncrementalJSONParser()
+    assert feed_all(parser, ['{"path": "C:\\\\', '"}']) == [(("path",), "C:\\")]
+
+
+def test_text_before_object_is_skipped():
+    parser = IncrementalJSONParser()
+    fields = feed_all(parser, ["Sure! ```json\n", '{"correct_answer": "C"}\n```'])
+    assert fields == [(("correct_answer",), "C")]
+    assert parser.done
+
+
+def test_scalar_values_split_across_chunks():
+    parser = IncrementalJSONParser()
+    assert feed_all(parser, ['{"difficulty": 1', '2, "ok": tr', 'ue}']) == [(("difficulty",), 12), (("ok",), True)]
+
+
+def test_stops_emitting_on_array():
+    parser = IncrementalJSONParser()
+    fields = feed_all(parser, ['{"question": "Q", "options": ["A", ', '"B"], "correct_answer": "A"}'])
+    assert fields == [(("question",), "Q")]
+    assert parser.failed and not parser.done
+    assert parser.feed('{"more": "x"}') == []
+
+
+def test_stops_emitting_on_malformed_scalar():
+    parser = IncrementalJSONParser()
+    assert feed_all(parser, ['{"a": "1", "b": nope, "c": "3"}']) == [(("a",), "1")]
+    assert parser.failed
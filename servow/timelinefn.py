@@ -0,0 +1,108 @@
+import heapq
+import itertools
+import threading
+import time
+
+from soundfn import sound_bank, measure_output_latency, PRIORITY_CUE
+
+
+class Timeline:
+    """
+    Sound cues placed on the same monotonic clock the FrameScheduler paces frames against
+    (the asyncio loop's clock), so a cue for a frame's deadline is heard as the frame appears.
+    - each cue starts output_latency early to make up for the mixer's buffering (calibrate())
+    - chain() lines sounds up back to back using their lengths, instead of starting them together
+    - cues are fired from one thread waiting on the next due time, nothing in the UI sleeps for them
+    - channel stealing between cues follows their priority, see SoundBank.play
+    """
+
+    def __init__(self, bank, output_latency=0.0):
+        self.bank = bank
+        self.output_latency = output_latency
+        self.heap = []  # (start time, order, name, priority)
+        self.order = itertools.count()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.lateness = []  # Seconds each cue fired after its start time
+
+    def calibrate(self):
+        """
+        Measure the mixer's output latency, after pygame.mixer.init().
+        """
+        self.output_latency = measure_output_latency()
+        return self.output_latency
+
+    def cue(self, name, at=None, priority=PRIORITY_CUE):
+        """
+        Play name so it is heard at time at (default now). Returns the time it ends, or None if
+        sound isn't ready yet (cues before the bank has loaded are dropped, like SoundBank.play).
+        """
+        if not self.bank.ready.is_set():
+            return None
+        at = time.monotonic() if at is None else at
+        with self.condition:
+            heapq.heappush(self.heap, (at - self.output_latency, next(self.order), name, priority))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="timeline", daemon=True)
+                self.thread.start()
+            self.condition.notify()
+        return at + self.bank.length(name)
+
+    def chain(self, names, at=None, priority=PRIORITY_CUE, gap=0.0):
+        """
+        Cue names one after another, each starting gap seconds after the previous one ends.
+        Returns when the last one ends.
+        """
+        at = time.monotonic() if at is None else at
+        for name in names:
+            at = self.cue(name, at, priority)
+            if at is None:
+                return None
+            at += gap
+        return at - gap
+
+    def cancel(self, names=None):
+        """
+        Drop pending cues, all of them or only those for names. Named sounds already playing
+        are stopped too, e.g. when the state that cued them ends early.
+        """
+        with self.condition:
+            if names is None:
+                self.heap = []
+            else:
+                self.heap = [cue for cue in self.heap if cue[2] not in names]
+                heapq.heapify(self.heap)
+        for name in names or ():
+            self.bank.stop(name)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.heap:
+                    self.condition.wait()
+                start, _, name, priority = self.heap[0]
+                remaining = start - time.monotonic()
+                if remaining > 0:
+                    self.condition.wait(remaining)  # Woken early if an earlier cue comes in
+                    continue
+                heapq.heappop(self.heap)
+            self.bank.play(name, priority)
+            self.lateness.append(time.monotonic() - start)
+            if len(self.lateness) > 1000:
+                del self.lateness[:500]
+
+    def stats(self):
+        lateness = sorted(self.lateness)
+        if not lateness:
+            return {"cues": 0, "output_latency_ms": self.output_latency * 1000}
+        return {
+            "cues": len(lateness),
+            "output_latency_ms": self.output_latency * 1000,
+            "mean_late_ms": sum(lateness) / len(lateness) * 1000,
+            "max_late_ms": lateness[-1] * 1000,
+            "steals": self.bank.steals,
+            "dropped": self.bank.dropped,
+        }
+
+
+timeline = Timeline(sound_bank)
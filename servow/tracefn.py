@@ -0,0 +1,189 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_DIR = os.getenv("SERVOW_METRICS_DIR", "metrics")
+TRACE_FILE = "trace.jsonl"  # Span records, one JSON object per line
+PROM_FILE = "servow.prom"  # Prometheus textfile collector format
+LOG_FILE = "kiosk.log"  # print() output while the UI owns the terminal, see open_log
+TRACE_MAX_BYTES = 5 * 1024 * 1024
+TRACE_BACKUPS = 3
+
+# Upper bounds in seconds, shared by every histogram
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # Last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class RotatingJSONLWriter:
+    """
+    Appends JSON lines to a file, rolling it over to .1, .2, ... once it passes max_bytes.
+    """
+
+    def __init__(self, path, max_bytes=TRACE_MAX_BYTES, backups=TRACE_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    def write(self, records):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+            for i in range(self.backups - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{i}"):
+                    os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        with open(self.path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+
+def open_log(directory=METRICS_DIR, name=LOG_FILE, max_bytes=TRACE_MAX_BYTES):
+    """
+    Line-buffered file to send stdout/stderr to while curses is up. The renderer only redraws
+    cells that changed, so anything printed to the terminal would stay on screen.
+    The previous log is kept as .1 once it passes max_bytes.
+    """
+    path = os.path.join(directory, name)
+    os.makedirs(directory, exist_ok=True)
+    if os.path.exists(path) and os.path.getsize(path) > max_bytes:
+        os.replace(path, f"{path}.1")
+    return open(path, "a", encoding="utf-8", buffering=1)
+
+
+class Metrics:
+    """
+    Spans, counters, gauges and histograms for kiosk sessions.
+    Recording only touches memory (a few increments under a lock), flush() does the file I/O,
+    so it is cheap enough to call from the render loop.
+    Gauges for state that isn't counted as it changes (e.g. pool depth) are set by collectors,
+    see add_collector().
+    """
+
+    def __init__(self, directory=METRICS_DIR):
+        self.directory = directory
+        self.writer = RotatingJSONLWriter(os.path.join(directory, TRACE_FILE))
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.collectors = []
+        self.pending = []  # Span records not yet written
+        self.session = None
+
+    def set_directory(self, directory):
+        self.directory = directory
+        self.writer = RotatingJSONLWriter(os.path.join(directory, TRACE_FILE))
+
+    def start_session(self):
+        self.session = f"{time.time():.3f}"
+
+    @contextmanager
+    def span(self, stage, **attrs):
+        """
+        Time a block, recording it as a span record and in the stage_seconds histogram.
+        """
+        start_wall = time.time()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            record = {"session": self.session, "stage": stage, "start": start_wall, "seconds": elapsed}
+            record.update(attrs)
+            with self.lock:
+                self.pending.append(record)
+            self.observe("stage_seconds", elapsed, stage=stage)
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.gauges[key] = value
+
+    def add_collector(self, collect):
+        """
+        collect() is called at the start of every flush() to set gauges.
+        """
+        self.collectors.append(collect)
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def flush(self):
+        """
+        Write pending spans to the JSON-lines trace and rewrite the Prometheus textfile.
+        """
+        for collect in self.collectors:
+            try:
+                collect()
+            except Exception as e:
+                print(f"Metrics collector failed: {e!r}")
+        with self.lock:
+            records, self.pending = self.pending, []
+            lines = self._prometheus_lines()
+        try:
+            if records:
+                self.writer.write(records)
+            path = os.path.join(self.directory, PROM_FILE)
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(path + ".tmp", path)  # Atomic, so the collector never reads half a file
+        except OSError as e:
+            print(f"Could not write metrics: {e}")
+
+    def _prometheus_lines(self):
+        lines = []
+        typed = set()
+        for (name, labels), value in sorted(self.counters.items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE servow_{name} counter")
+            lines.append(f"servow_{name}{_labels(labels)} {value}")
+        for (name, labels), value in sorted(self.gauges.items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE servow_{name} gauge")
+            lines.append(f"servow_{name}{_labels(labels)} {value}")
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE servow_{name} histogram")
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f"servow_{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"servow_{name}_sum{_labels(labels)} {histogram.total}")
+            lines.append(f"servow_{name}_count{_labels(labels)} {histogram.count}")
+        return lines
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+metrics = Metrics()